@@ -0,0 +1,81 @@
+"""Measure the Prompt classifier throughput over a synthetic tweet corpus.
+
+Usage: python benchmarks/classifier.py [--tweets N] [--seed N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import warnings
+from pathlib import Path
+from time import perf_counter
+
+import tweepy
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# sys_vars needs to know where to look before anything imports it
+os.environ.setdefault("SYS_VARS_PATH", tempfile.mkdtemp())
+
+from src.helpers import classifier, config, tweet  # noqa: E402
+
+
+WORDS = ["apple", "ember", "hollow", "lantern", "meridian", "quiet", "tide", "veil"]
+NOISE = ["amwriting", "flashfiction", "micropoetry", "writingcommunity", "vsspoem"]
+
+
+def create_corpus(size: int, seed: int) -> list[tweepy.Tweet]:
+    """Create a corpus of tweets where about 1 in 20 is a Prompt."""
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(size):
+        hts = rng.sample(NOISE, rng.randint(0, 3))
+        if rng.random() < 0.05:
+            hts = ["vss365", "prompt", rng.choice(WORDS), *hts]
+        elif rng.random() < 0.5:
+            hts.insert(0, "vss365")
+
+        entities = {"hashtags": [{"start": 0, "end": 0, "tag": ht} for ht in hts]}
+        corpus.append(
+            tweepy.Tweet({"id": str(i), "text": "", "entities": entities or None})
+        )
+    return corpus
+
+
+def report(name: str, count: int, elapsed: float) -> None:
+    print(f"{name:<24} {count / elapsed:>12,.0f} tweets/sec ({elapsed:.3f}s)")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tweets", type=int, default=300_000)
+    parser.add_argument("--seed", type=int, default=365)
+    args = parser.parse_args()
+
+    # The synthetic tweets don't carry every default field
+    warnings.simplefilter("ignore", RuntimeWarning)
+    corpus = create_corpus(args.tweets, args.seed)
+
+    # Scanning a timeline one tweet at a time, as find_prompt does
+    start = perf_counter()
+    found = sum(1 for status in corpus if tweet.is_likely_prompt_tweet(status))
+    report("scan (per tweet)", len(corpus), perf_counter() - start)
+
+    # Extracting the Prompt word, as recording a Prompt does
+    compiled = config.current().default
+    start = perf_counter()
+    words = [
+        word
+        for status in corpus
+        if (word := compiled.get_prompt(classifier.get_hashtags(status)))
+    ]
+    report("prompt word (per tweet)", len(corpus), perf_counter() - start)
+
+    print(f"{found:,} Prompt tweets, {len(words):,} Prompt words")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
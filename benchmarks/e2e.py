@@ -0,0 +1,257 @@
+"""Run the finder commands end to end against local Twitter and API stand-ins.
+
+Usage: python benchmarks/e2e.py [--runs N] [--latency-ms MS] [--payload-bytes N]
+           [--timeline-size N] [--prompt-position N] [--save FILE] [--compare FILE]
+"""
+
+import argparse
+import builtins
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import warnings
+from dataclasses import asdict
+from datetime import date, datetime, time, timedelta
+from importlib import import_module
+from pathlib import Path
+from statistics import mean
+from time import perf_counter
+from typing import Any, Callable
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# sys_vars needs to know where to look before anything imports it
+os.environ.setdefault("SYS_VARS_PATH", tempfile.mkdtemp())
+
+from benchmarks.stubs import ApiStub, StubOptions, TwitterStub  # noqa: E402
+
+
+# The commands refuse to run after their cutoff date, so pretend it is this day
+TODAY = date(2023, 6, 15)
+
+
+def frozen_today(day: date) -> contextlib.ExitStack:
+    """Make the task modules believe today is the given day."""
+
+    class FrozenDate(date):
+        @classmethod
+        def today(cls) -> "FrozenDate":
+            return cls(day.year, day.month, day.day)
+
+    class FrozenDateTime(datetime):
+        @classmethod
+        def now(cls, tz: Any = None) -> "FrozenDateTime":
+            return cls.combine(day, time(12), tzinfo=tz)
+
+    stack = contextlib.ExitStack()
+    for name in ("archive", "backfill", "email", "fetch", "manual", "stream"):
+        module = import_module(f"src.core.{name}")
+        for attr, frozen in (("date", FrozenDate), ("datetime", FrozenDateTime)):
+            if hasattr(module, attr):
+                stack.enter_context(_patch(module, attr, frozen))
+    return stack
+
+
+@contextlib.contextmanager
+def _patch(obj: Any, attr: str, value: Any):
+    original = getattr(obj, attr)
+    setattr(obj, attr, value)
+    try:
+        yield
+    finally:
+        setattr(obj, attr, original)
+
+
+def scripted_input(answers: list[str]) -> contextlib.AbstractContextManager:
+    """Answer the interactive questions a command asks, in order."""
+    replies = iter(answers)
+    return _patch(builtins, "input", lambda prompt="": next(replies))
+
+
+def scenarios(twitter: TwitterStub) -> dict[str, Callable[[], Any]]:
+    """Create the commands to benchmark."""
+    prompt_tweet = twitter.tweets[twitter.options.prompt_position]
+    prompt_url = f"https://twitter.com/{prompt_tweet['author_id']}/status/"
+    prompt_url += prompt_tweet["id"]
+
+    def fetch() -> Any:
+        return import_module("src.core.fetch").main()
+
+    def manual() -> Any:
+        answers = [TODAY.isoformat(), prompt_url, "n", "y", "y"]
+        with scripted_input(answers):
+            return import_module("src.core.manual").main()
+
+    # Correct a batch of Prompts at once, most of which aren't Prompt tweets
+    batch_file = Path(tempfile.mkdtemp()) / "prompts.csv"
+    batch_rows = ["date,url,additional,notify,archive"]
+    for i, batch_tweet in enumerate(twitter.tweets[:5]):
+        url = prompt_url.replace(prompt_tweet["id"], batch_tweet["id"])
+        batch_rows.append(
+            f"{TODAY - timedelta(days=i)},{url},n,{'y' if not i else 'n'},y"
+        )
+    batch_file.write_text("\n".join(batch_rows))
+
+    def batch() -> Any:
+        return import_module("src.core.manual").main(batch_file)
+
+    def archive() -> Any:
+        return import_module("src.core.archive").main(argparse.Namespace())
+
+    def email() -> Any:
+        with scripted_input([(TODAY - timedelta(days=1)).isoformat()]):
+            return import_module("src.core.email").main(argparse.Namespace())
+
+    # Re-send a week of notifications after an email outage
+    def broadcast() -> Any:
+        args = argparse.Namespace(
+            start=TODAY - timedelta(days=7),
+            end=TODAY - timedelta(days=1),
+            select="all",
+            dry_run=False,
+        )
+        return import_module("src.core.email").main(args)
+
+    def stream() -> Any:
+        return import_module("src.core.stream").watch(limit=1)
+
+    return {
+        "fetch": fetch,
+        "manual": manual,
+        "batch": batch,
+        "archive": archive,
+        "email": email,
+        "broadcast": broadcast,
+        "stream": stream,
+    }
+
+
+def run(
+    name: str, task: Callable, servers: list, runs: int, verbose: bool
+) -> dict[str, Any]:
+    """Run a command multiple times from a cold state and collect its stats."""
+    wall_times = []
+    calls: dict[str, dict[str, float]] = {}
+    for _ in range(runs):
+        # Every run starts from scratch so no local state or cache is reused
+        os.environ["DATA_DIR"] = tempfile.mkdtemp()
+        import_module("src.helpers.tweet").twitter_v2_api.cache_clear()
+        for server in servers:
+            server.reset()
+
+        output = io.StringIO()
+        with frozen_today(TODAY), contextlib.redirect_stdout(
+            sys.stdout if verbose else output
+        ):
+            start = perf_counter()
+            task()
+            wall_times.append(perf_counter() - start)
+
+        for server in servers:
+            for route, stats in server.stats.items():
+                call = calls.setdefault(route, {"count": 0, "seconds": 0, "bytes": 0})
+                for key, value in asdict(stats).items():
+                    call[key] += value
+
+    return {
+        "name": name,
+        "wall_ms": [round(t * 1000, 2) for t in wall_times],
+        "requests": sum(call["count"] for call in calls.values()) / runs,
+        "calls": {
+            route: {
+                "count": call["count"] / runs,
+                "latency_ms": round(call["seconds"] / call["count"] * 1000, 2),
+                "bytes": call["bytes"] / runs,
+            }
+            for route, call in sorted(calls.items())
+        },
+    }
+
+
+def report(result: dict[str, Any]) -> None:
+    wall_ms = result["wall_ms"]
+    print(
+        f"{result['name']}: {mean(wall_ms):.1f}ms mean"
+        f" ({min(wall_ms):.1f}-{max(wall_ms):.1f}ms),"
+        f" {result['requests']:g} requests/run"
+    )
+    for route, call in result["calls"].items():
+        print(
+            f"  {route:<40} {call['count']:>5g}x {call['latency_ms']:>8.2f}ms"
+            f" {call['bytes']:>10,.0f}B"
+        )
+
+
+def compare(results: list[dict[str, Any]], baseline_file: Path) -> bool:
+    """Check that no command makes more requests than it did in the baseline."""
+    baseline = {r["name"]: r for r in json.loads(baseline_file.read_text())}
+    passed = True
+    for result in results:
+        if (before := baseline.get(result["name"])) is None:
+            continue
+        if result["requests"] > before["requests"]:
+            print(
+                f"REGRESSION {result['name']}: {before['requests']:g} ->"
+                f" {result['requests']:g} requests/run"
+            )
+            passed = False
+    return passed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--payload-bytes", type=int, default=0)
+    parser.add_argument("--timeline-size", type=int, default=200)
+    parser.add_argument("--prompt-position", type=int, default=20)
+    parser.add_argument(
+        "--only", nargs="+", help="only run these commands", default=None
+    )
+    parser.add_argument("--save", type=Path, help="save the results as JSON")
+    parser.add_argument(
+        "--compare", type=Path, help="fail if any command makes more requests"
+    )
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    options = StubOptions(
+        latency_ms=args.latency_ms,
+        payload_bytes=args.payload_bytes,
+        timeline_size=args.timeline_size,
+        prompt_position=args.prompt_position,
+    )
+    downloads = Path(tempfile.mkdtemp())
+    (downloads / f"{TODAY.isoformat()}.xlsx").touch()
+
+    # The synthetic tweets don't carry every default field
+    warnings.simplefilter("ignore", RuntimeWarning)
+    results = []
+    with TwitterStub(options, TODAY) as twitter, ApiStub(options, TODAY) as api:
+        os.environ.update({
+            "API_AUTH_TOKEN": "benchmark",
+            "API_DOMAIN": api.url,
+            "DOWNLOADS_PATH": str(downloads),
+            "IMAGES_DIR": tempfile.mkdtemp(),
+            "TWITTER_API_URL": twitter.url,
+            "TWITTER_BEARER": "benchmark",
+        })
+        for name, task in scenarios(twitter).items():
+            if args.only and name not in args.only:
+                continue
+            results.append(run(name, task, [twitter, api], args.runs, args.verbose))
+            report(results[-1])
+
+    if args.save:
+        args.save.write_text(json.dumps(results, indent=2))
+    if args.compare and not compare(results, args.compare):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
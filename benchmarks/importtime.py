@@ -0,0 +1,99 @@
+"""Measure the cold start import time of the finder and each of its commands.
+
+Usage: python benchmarks/importtime.py [--runs N] [--budget-ms MS]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from statistics import median
+from typing import NamedTuple
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# What gets imported for each command when it is dispatched
+TARGETS = {
+    "finder --help": ["finder.py", "--help"],
+    "archive": ["-c", "import src.core.archive"],
+    "backup": ["-c", "import src.core.backup"],
+    "email": ["-c", "import src.core.email"],
+    "prompt": ["-c", "import src.core.fetch"],
+    "prompt --manual": ["-c", "import src.core.manual"],
+    "prompt --backfill": ["-c", "import src.core.backfill"],
+    "jobs": ["-c", "import src.core.jobs"],
+    "media": ["-c", "import src.core.media"],
+    "schedule --adaptive": ["-c", "import src.core.polling"],
+    "schedule --all": ["-c", "import src.core.daemon"],
+    "schedule --stream": ["-c", "import src.core.stream"],
+}
+
+
+class ImportTime(NamedTuple):
+    total_us: int
+
+    # The modules that took the longest to import by themselves
+    slowest: list[tuple[int, str]]
+
+
+def measure(args: list[str], env: dict[str, str]) -> ImportTime:
+    """Run a Python process with `-X importtime` and parse its report."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    # Each line is formatted as `import time: self [us] | cumulative | package`,
+    # with nested imports indented under the package that imported them
+    total_us = 0
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative, package = line.removeprefix("import time:").split("|")
+        modules.append((int(self_us), package.strip()))
+        if not package.startswith("  "):
+            total_us += int(cumulative)
+    return ImportTime(total_us, sorted(modules, reverse=True)[:5])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5, help="runs per command")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=None,
+        help="fail if any command's median import time exceeds this",
+    )
+    args = parser.parse_args()
+
+    # The imports need a place to look for system variables,
+    # but nothing should be read from it at import time
+    env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}
+    env.setdefault("SYS_VARS_PATH", tempfile.mkdtemp())
+
+    over_budget = False
+    for name, target in TARGETS.items():
+        runs = [measure(target, env) for _ in range(args.runs)]
+        median_ms = median(run.total_us for run in runs) / 1000
+        slowest = ", ".join(
+            f"{package} {us / 1000:.1f}ms" for us, package in runs[-1].slowest
+        )
+        print(f"{name:<20} {median_ms:8.1f}ms  ({slowest})")
+
+        if args.budget_ms is not None and median_ms > args.budget_ms:
+            over_budget = True
+
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
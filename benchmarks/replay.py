@@ -0,0 +1,269 @@
+"""Replay Host timelines through the Prompt detection used when fetching Prompts.
+
+Usage: python benchmarks/replay.py [CORPUS] [--cases N] [--seed N] [--repeat N]
+           [--write FILE] [--save FILE] [--compare FILE] [--tolerance F] [-v]
+
+Each line of a JSON lines corpus is one fetch: when it ran (`now`), the date of
+the latest recorded Prompt (`latest`), the newest tweet already looked at
+(`since_id`, optional), the Host timeline newest first as Twitter API v2 JSON
+(`data` and `includes`), and the Prompt that should be found (`expected`, with
+its `id`, `word`, and `date`, or null). Without a corpus, a synthetic one is made.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import tracemalloc
+import warnings
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Iterable, Iterator
+
+import tweepy
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# sys_vars needs to know where to look before anything imports it
+os.environ.setdefault("SYS_VARS_PATH", tempfile.mkdtemp())
+
+from src.core import fetch  # noqa: E402
+from src.helpers import tweet  # noqa: E402
+from src.helpers.candidate import PromptCandidate  # noqa: E402
+
+
+HOST = {"id": "365", "name": "Host", "username": "vss365host"}
+WORDS = ["apple", "ember", "hollow", "lantern", "meridian", "quiet", "tide", "veil"]
+NOISE = ["amwriting", "flashfiction", "micropoetry", "writingcommunity", "vsspoem"]
+
+
+def make_tweet(tweet_id: int, created_at: datetime, hts: list[str]) -> dict:
+    """Create a tweet as the Twitter API sends it."""
+    return {
+        "id": str(tweet_id),
+        "text": " ".join(f"#{ht}" for ht in hts),
+        "author_id": HOST["id"],
+        "edit_history_tweet_ids": [str(tweet_id)],
+        "created_at": created_at.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+        "entities": {"hashtags": [{"start": 0, "end": 0, "tag": ht} for ht in hts]},
+    }
+
+
+def generate(cases: int, seed: int) -> list[dict]:
+    """Create a corpus of Host timelines and the Prompts that should be found.
+
+    Most days have a Prompt, some sent the evening before in UTC because of time
+    zones, and some have none yet. Timelines are padded with community tweets,
+    Prompt reminders, and yesterday's Prompt, which the cursor hides.
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(cases):
+        today = date(2023, 1, 1) + timedelta(days=i % 365)
+        now = datetime.combine(today, time(rng.randrange(1, 23)), tzinfo=timezone.utc)
+        midnight = datetime.combine(today, time.min, tzinfo=timezone.utc)
+        kind = rng.choices(["normal", "early", "none"], weights=[7, 2, 1])[0]
+        word = rng.choice(WORDS)
+
+        # Yesterday's Prompt was recorded and the cursor moved past it
+        sent: list[tuple[datetime, list[str]]] = [(
+            midnight - timedelta(hours=rng.randrange(12, 24)),
+            ["vss365", "prompt", "x"],
+        )]
+        if kind == "normal":
+            sent.append((
+                midnight + (now - midnight) * rng.random(),
+                ["vss365", "prompt", word, *rng.sample(NOISE, 2)],
+            ))
+        elif kind == "early":
+            sent.append((
+                midnight - timedelta(minutes=rng.randrange(1, 300)),
+                ["vss365", "prompt", word],
+            ))
+
+        # Everything else the Host tweets, going back two days
+        for _ in range(rng.randrange(20, 200)):
+            hts = ["vss365", *rng.sample(NOISE, rng.randrange(0, 3))]
+            if rng.random() < 0.05:
+                hts = ["vss365", "prompt"]
+            sent.append((now - timedelta(minutes=rng.randrange(1, 2880)), hts))
+
+        sent.sort(key=lambda s: s[0], reverse=True)
+        first_id = 1_000_000 * (i + 1)
+        timeline = [
+            make_tweet(first_id + len(sent) - n, created_at, hts)
+            for n, (created_at, hts) in enumerate(sent)
+            if created_at < now
+        ]
+        prompt_ids = [
+            t["id"] for t in timeline if t["text"].startswith("#vss365 #prompt ")
+        ]
+        expected = None
+        if kind != "none":
+            expected = {"id": prompt_ids[0], "word": word, "date": today.isoformat()}
+        corpus.append({
+            "now": now.isoformat(),
+            "latest": (today - timedelta(days=1)).isoformat(),
+            "since_id": prompt_ids[-1],
+            "data": timeline,
+            "includes": {"users": [HOST]},
+            "expected": expected,
+        })
+    return corpus
+
+
+def load_case(case: dict) -> tuple[datetime, date, tweepy.Response]:
+    """Turn a corpus line into what a fetch would have had to work with."""
+    # The API only gives back tweets newer than the cursor
+    since_id = int(case.get("since_id") or 0)
+    data = [tweepy.Tweet(t) for t in case["data"] if int(t["id"]) > since_id]
+    includes = {
+        name: [tweet.INCLUDE_TYPES[name](item) for item in items]
+        for name, items in case.get("includes", {}).items()
+        if name in tweet.INCLUDE_TYPES
+    }
+    page = tweepy.Response(data, includes, [], {})
+    return datetime.fromisoformat(case["now"]), date.fromisoformat(case["latest"]), page
+
+
+def detect(
+    timeline: Iterable[tweepy.Response], now: datetime, latest: date
+) -> dict | None:
+    """Find the Prompt the same way fetching does, without recording it."""
+    found, _ = fetch.scan_timeline(timeline, now)
+    if found is None:
+        return None
+
+    candidate = PromptCandidate.from_tweet(found)
+    if (prompt_date := fetch.date_to_record(candidate, now.date(), latest)) is None:
+        return None
+    return {"id": candidate.id, "word": candidate.word, "date": prompt_date.isoformat()}
+
+
+def counted(timeline: Iterable[tweepy.Response], seen: list[int]) -> Iterator:
+    """Count the tweets that are looked at."""
+    for response in timeline:
+        seen[0] += 1
+        yield response
+
+
+def replay(cases: list[tuple[datetime, date, tweepy.Response]]) -> None:
+    for now, latest, page in cases:
+        detect(tweet.flatten([page]), now, latest)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("corpus", type=Path, nargs="?", help="JSON lines corpus")
+    parser.add_argument("--cases", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--write", type=Path, help="save the synthetic corpus")
+    parser.add_argument("--save", type=Path, help="save the results as JSON")
+    parser.add_argument(
+        "--compare", type=Path, help="fail if accuracy, speed, or memory get worse"
+    )
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if args.corpus:
+        with args.corpus.open() as f:
+            corpus = [json.loads(line) for line in f if line.strip()]
+    else:
+        corpus = generate(args.cases, args.seed)
+        if args.write:
+            args.write.write_text("".join(json.dumps(case) + "\n" for case in corpus))
+
+    # The synthetic tweets don't carry every default field
+    warnings.simplefilter("ignore", RuntimeWarning)
+    cases = [load_case(case) for case in corpus]
+    tweets = sum(len(page.data) for _, _, page in cases)
+
+    # Check what was found against what should have been
+    seen = [0]
+    correct = missed = extra = wrong = 0
+    for case, (now, latest, page) in zip(corpus, cases):
+        found = detect(counted(tweet.flatten([page]), seen), now, latest)
+        expected = case.get("expected")
+        if found == expected:
+            correct += 1
+            continue
+        if found is None:
+            missed += 1
+        elif expected is None:
+            extra += 1
+        else:
+            wrong += 1
+        if args.verbose:
+            print(f"{case['now']}: expected {expected}, found {found}")
+
+    # Time the detection alone, keeping the fastest run
+    timings = []
+    for _ in range(args.repeat):
+        start = perf_counter()
+        replay(cases)
+        timings.append(perf_counter() - start)
+    seconds = min(timings)
+
+    # Measure memory separately since tracing slows everything down
+    tracemalloc.start()
+    replay(cases)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result = {
+        "cases": len(cases),
+        "tweets": tweets,
+        "scanned": seen[0],
+        "accuracy": round(correct / len(cases), 4) if cases else 0.0,
+        "tweets_per_sec": round(seen[0] / seconds) if seconds else 0,
+        "peak_bytes": peak,
+    }
+    print(f"replay: {len(cases):,} fetches, {tweets:,} tweets ({seen[0]:,} scanned)")
+    print(f"  {'accuracy':<16} {result['accuracy']:.2%} ({correct:,}/{len(cases):,})")
+    print(f"  {'missed':<16} {missed:,}")
+    print(f"  {'false positives':<16} {extra:,}")
+    print(f"  {'wrong Prompt':<16} {wrong:,}")
+    print(f"  {'speed':<16} {result['tweets_per_sec']:,} tweets/sec ({seconds:.3f}s)")
+    print(f"  {'peak memory':<16} {peak / 1024:,.1f} KiB")
+
+    if args.save:
+        args.save.write_text(json.dumps(result, indent=2))
+    if args.compare:
+        return compare(result, json.loads(args.compare.read_text()), args.tolerance)
+    return 0
+
+
+def compare(result: dict[str, Any], baseline: dict[str, Any], tolerance: float) -> int:
+    """Check that detection is no less accurate, slower, or bigger than before."""
+    failures = []
+    if result["accuracy"] < baseline["accuracy"]:
+        failures.append(
+            f"accuracy {baseline['accuracy']:.2%} -> {result['accuracy']:.2%}"
+        )
+    if result["tweets_per_sec"] < baseline["tweets_per_sec"] * (1 - tolerance):
+        failures.append(
+            f"speed {baseline['tweets_per_sec']:,} -> {result['tweets_per_sec']:,}"
+            " tweets/sec"
+        )
+
+    # Detection only holds on to a few KiB, so allow for noise at that size
+    allowed = max(
+        baseline["peak_bytes"] * (1 + tolerance), baseline["peak_bytes"] + 16384
+    )
+    if result["peak_bytes"] > allowed:
+        failures.append(
+            f"peak memory {baseline['peak_bytes']:,} -> {result['peak_bytes']:,} bytes"
+        )
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,350 @@
+"""Local stand-ins for the Twitter API v2 and the #vss365 today API v2."""
+
+import itertools
+import json
+import re
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter, sleep
+from typing import Any, Callable, Iterator, Self
+from urllib.parse import parse_qs, urlsplit
+
+__all__ = ["ApiStub", "StubOptions", "StubServer", "TwitterStub"]
+
+
+HOST_UID = "365"
+HOST_HANDLE = "vss365host"
+
+
+@dataclass
+class StubOptions:
+    # Delay added to every response, in milliseconds
+    latency_ms: float = 0.0
+
+    # Extra bytes of padding added to every response body
+    payload_bytes: int = 0
+
+    # Number of tweets in the Host timeline
+    timeline_size: int = 200
+
+    # Position of the Prompt tweet in the timeline, newest first
+    prompt_position: int = 20
+
+
+@dataclass
+class RouteStats:
+    count: int = 0
+    seconds: float = 0.0
+    bytes: int = 0
+
+
+@dataclass
+class Route:
+    method: str
+    pattern: re.Pattern
+    handler: Callable[..., Any]
+
+
+@dataclass
+class StubServer:
+    """A threaded HTTP server that answers from a table of routes."""
+
+    options: StubOptions
+    today: date
+    routes: list[Route] = field(default_factory=list)
+    stats: dict[str, RouteStats] = field(
+        default_factory=lambda: defaultdict(RouteStats)
+    )
+
+    def __post_init__(self) -> None:
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.__handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.reset()
+
+    def __enter__(self) -> Self:
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def route(self, method: str, pattern: str) -> Callable:
+        """Register a handler for requests matching a path pattern."""
+
+        def decorator(handler: Callable) -> Callable:
+            self.routes.append(Route(method, re.compile(f"^{pattern}$"), handler))
+            return handler
+
+        return decorator
+
+    def reset(self) -> None:
+        """Clear all recorded request statistics."""
+        with self.lock:
+            self.stats.clear()
+
+    def __handler(self) -> type[BaseHTTPRequestHandler]:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def handle_one(self) -> None:
+                start = perf_counter()
+                parts = urlsplit(self.path)
+                query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or "null")
+
+                # Find who should answer this request
+                for route in stub.routes:
+                    if route.method == self.command and (
+                        match := route.pattern.match(parts.path)
+                    ):
+                        name = f"{self.command} {route.pattern.pattern[1:-1]}"
+                        status, content = route.handler(*match.groups(), query, body)
+                        break
+                else:
+                    name = f"{self.command} (unmatched)"
+                    status, content = 404, {"detail": "Not Found"}
+
+                # Streamed responses are sent a chunk at a time as they are made
+                if isinstance(content, Iterator):
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    sent = 0
+                    for chunk in content:
+                        self.wfile.write(f"{len(chunk):X}\r\n".encode())
+                        self.wfile.write(chunk + b"\r\n")
+                        self.wfile.flush()
+                        sent += len(chunk)
+                    self.wfile.write(b"0\r\n\r\n")
+                    self.__record(name, start, sent)
+                    return
+
+                # Pad the response to the requested size and pretend to be slow
+                if isinstance(content, dict) and stub.options.payload_bytes:
+                    content["padding"] = "x" * stub.options.payload_bytes
+                if isinstance(content, bytes):
+                    payload, content_type = content, "application/octet-stream"
+                else:
+                    payload = (
+                        json.dumps(content).encode() if content is not None else b""
+                    )
+                    content_type = "application/json"
+                sleep(stub.options.latency_ms / 1000)
+
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                self.__record(name, start, len(payload))
+
+            def __record(self, name: str, start: float, sent: int) -> None:
+                with stub.lock:
+                    stats = stub.stats[name]
+                    stats.count += 1
+                    stats.seconds += perf_counter() - start
+                    stats.bytes += sent
+
+            do_GET = do_POST = do_PUT = do_DELETE = handle_one
+
+        return Handler
+
+
+class TwitterStub(StubServer):
+    """Mimic the Twitter API v2 user timeline, tweet lookup, and filtered stream.
+
+    The tweet media is served by the stub too, standing in for Twitter's CDN.
+    """
+
+    def __post_init__(self) -> None:
+        super().__post_init__()
+        self.route("GET", r"/2/users/(\d+)/tweets")(self.__timeline)
+        self.route("GET", r"/2/tweets/(\d+)")(self.__lookup)
+        self.route("GET", r"/2/tweets")(self.__bulk_lookup)
+        self.route("GET", r"/2/tweets/search/stream")(self.__stream)
+        self.route("GET", r"/2/tweets/search/stream/rules")(self.__rules)
+        self.route("POST", r"/2/tweets/search/stream/rules")(self.__update_rules)
+        self.route("GET", r"/media/([\w.]+)")(self.__media)
+
+    def reset(self) -> None:
+        super().reset()
+        self.rules: list[dict[str, str]] = []
+        self.rule_ids = itertools.count(1)
+
+        # Tweets are sent every 10 minutes going back from noon UTC today
+        noon = datetime.combine(self.today, time(12), tzinfo=timezone.utc)
+        self.tweets: list[dict[str, Any]] = []
+        for i in range(self.options.timeline_size):
+            is_prompt = i == self.options.prompt_position
+            hts = ["vss365", "prompt", "meridian"] if is_prompt else ["vss365"]
+            created_at = noon - timedelta(minutes=10 * i)
+            tweet: dict[str, Any] = {
+                "id": str(1_000_000 - i),
+                "text": " ".join(f"#{ht}" for ht in hts),
+                "author_id": HOST_UID,
+                "edit_history_tweet_ids": [str(1_000_000 - i)],
+                "created_at": created_at.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                "entities": {
+                    "hashtags": [{"start": 0, "end": 0, "tag": ht} for ht in hts]
+                },
+            }
+            if is_prompt:
+                tweet["attachments"] = {"media_keys": ["3_1"]}
+            self.tweets.append(tweet)
+
+    def __includes(self, tweets: list[dict]) -> dict:
+        includes: dict[str, list] = {
+            "users": [{"id": HOST_UID, "name": "Host", "username": HOST_HANDLE}]
+        }
+        if any("attachments" in tweet for tweet in tweets):
+            includes["media"] = [{
+                "media_key": "3_1",
+                "type": "photo",
+                "url": f"{self.url}/media/meridian.jpg",
+                "alt_text": "A meridian line",
+            }]
+        return includes
+
+    def __timeline(self, uid: str, query: dict, body: Any) -> tuple[int, dict]:
+        tweets = self.tweets
+        if "since_id" in query:
+            tweets = [t for t in tweets if int(t["id"]) > int(query["since_id"])]
+        if "start_time" in query:
+            start_time = datetime.fromisoformat(query["start_time"])
+            tweets = [
+                t
+                for t in tweets
+                if datetime.fromisoformat(t["created_at"]) >= start_time
+            ]
+        if "end_time" in query:
+            end_time = datetime.fromisoformat(query["end_time"])
+            tweets = [
+                t for t in tweets if datetime.fromisoformat(t["created_at"]) < end_time
+            ]
+
+        # Page through the results using the offset as the token
+        offset = int(query.get("pagination_token", 0))
+        page_size = int(query.get("max_results", 10))
+        page = tweets[offset : offset + page_size]
+        meta: dict[str, Any] = {"result_count": len(page)}
+        if offset + page_size < len(tweets):
+            meta["next_token"] = str(offset + page_size)
+        if not page:
+            return 200, {"meta": meta}
+        return 200, {"data": page, "includes": self.__includes(page), "meta": meta}
+
+    def __lookup(self, tweet_id: str, query: dict, body: Any) -> tuple[int, dict]:
+        for tweet in self.tweets:
+            if tweet["id"] == tweet_id:
+                return 200, {"data": tweet, "includes": self.__includes([tweet])}
+        return 404, {"title": "Not Found Error"}
+
+    def __media(self, name: str, query: dict, body: Any) -> tuple[int, bytes]:
+        return 200, name.encode() * 1024
+
+    def __bulk_lookup(self, query: dict, body: Any) -> tuple[int, dict]:
+        ids = set(query.get("ids", "").split(","))
+        tweets = [tweet for tweet in self.tweets if tweet["id"] in ids]
+        return 200, {"data": tweets, "includes": self.__includes(tweets)}
+
+    def __matches(self, rule: str, tweet: dict) -> bool:
+        # Only the `from:` and hashtag operators are understood
+        hts = {ht["tag"].lower() for ht in tweet["entities"]["hashtags"]}
+        for term in rule.split():
+            if term.startswith("from:") and term[5:] != tweet["author_id"]:
+                return False
+            if term.startswith("#") and term[1:].lower() not in hts:
+                return False
+        return True
+
+    def __stream(self, query: dict, body: Any) -> tuple[int, Iterator[bytes]]:
+        def lines() -> Iterator[bytes]:
+            # Start with a keep-alive, then send every matching tweet oldest first
+            # and close the connection as if Twitter had disconnected
+            yield b"\r\n"
+            for tweet in reversed(self.tweets):
+                matching = [r for r in self.rules if self.__matches(r["value"], tweet)]
+                if matching:
+                    line = {
+                        "data": tweet,
+                        "includes": self.__includes([tweet]),
+                        "matching_rules": [
+                            {"id": r["id"], "tag": r["tag"]} for r in matching
+                        ],
+                    }
+                    yield json.dumps(line).encode() + b"\r\n"
+
+        return 200, lines()
+
+    def __rules(self, query: dict, body: Any) -> tuple[int, dict]:
+        return 200, {"data": self.rules, "meta": {"result_count": len(self.rules)}}
+
+    def __update_rules(self, query: dict, body: dict) -> tuple[int, dict]:
+        with self.lock:
+            deleted = set(body.get("delete", {}).get("ids", []))
+            self.rules = [rule for rule in self.rules if rule["id"] not in deleted]
+            for rule in body.get("add", []):
+                self.rules.append({**rule, "id": str(next(self.rule_ids))})
+        return 200, {"meta": {"summary": {"created": len(body.get("add", []))}}}
+
+
+class ApiStub(StubServer):
+    """Mimic the #vss365 today API v2."""
+
+    def __post_init__(self) -> None:
+        super().__post_init__()
+        self.route("GET", r"/v2/prompts/")(self.__latest)
+        self.route("GET", r"/v2/prompts/date/([\d-]+)")(self.__by_date)
+        self.route("POST", r"/v2/prompts/")(self.__create)
+        self.route("POST", r"/v2/prompts/(\d+)/media/")(self.__no_content)
+        self.route("GET", r"/v2/hosts/current")(self.__host)
+        self.route("GET", r"/v2/hosts/date/([\d-]+)")(self.__host)
+        self.route("POST", r"/v2/archive/")(self.__no_content)
+        self.route("POST", r"/v2/notifications/([\d-]+)")(self.__no_content)
+
+    def reset(self) -> None:
+        super().reset()
+
+        # Start off with yesterday's Prompt already recorded
+        self.prompts: list[dict[str, Any]] = [{
+            "_id": 1,
+            "date": (self.today - timedelta(days=1)).isoformat(),
+            "word": "lantern",
+            "host_handle": HOST_HANDLE,
+            "twitter_id": "999000",
+        }]
+
+    def __latest(self, query: dict, body: Any) -> tuple[int, list]:
+        return 200, sorted(self.prompts, key=lambda p: p["date"], reverse=True)[:1]
+
+    def __by_date(self, prompt_date: str, query: dict, body: Any) -> tuple[int, list]:
+        return 200, [p for p in self.prompts if p["date"] == prompt_date]
+
+    def __create(self, query: dict, body: dict) -> tuple[int, dict]:
+        with self.lock:
+            prompt = {**body, "_id": len(self.prompts) + 1}
+            self.prompts.append(prompt)
+        return 201, {"_id": prompt["_id"]}
+
+    def __host(self, *args: Any) -> tuple[int, dict]:
+        return 200, {"_id": 1, "handle": HOST_HANDLE, "twitter_uid": HOST_UID}
+
+    def __no_content(self, *args: Any) -> tuple[int, None]:
+        return 200, None
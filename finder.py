@@ -1,7 +1,10 @@
 import argparse
 import logging
+from datetime import date
 from importlib import import_module
+from pathlib import Path
 from types import ModuleType
+from typing import Any, Callable
 
 from src.helpers import logger
 
@@ -16,16 +19,68 @@ def get_task_main(module_name: str) -> ModuleType:
     return import_module(f"src.core.{module_name}")
 
 
+def lazy_task(module_name: str, func_name: str = "main") -> Callable:
+    """Create a command handler that only imports its task when dispatched."""
+
+    def handler(args: argparse.Namespace) -> Any:
+        return getattr(get_task_main(module_name), func_name)(args)
+
+    return handler
+
+
 def handle_prompt_command(args: argparse.Namespace) -> bool:
+    if args.from_file and not args.manual:
+        parser_prompt.error("--from can only be used with --manual")
+
+    if args.backfill:
+        logging.info("Running Prompt backfill...")
+        return get_task_main("backfill").main(*args.backfill)  # type: ignore
+
     if args.manual:
         logging.info("Running manual Prompt...")
-        return get_task_main("manual").main()  # type: ignore
+        return get_task_main("manual").main(args.from_file)  # type: ignore
 
     logging.info("Running fetch Prompt...")
-    return get_task_main("fetch").main()  # type: ignore
+    if not get_task_main("fetch").main():  # type: ignore
+        return False
+
+    # There's no worker to send out the Prompt's follow-up tasks when
+    # run by hand, so run them before exiting
+    get_task_main("jobs").drain()  # type: ignore
+    return True
+
+
+def email_selection(value: str) -> str:
+    """Check an email broadcast Prompt selection."""
+    if value in ("latest", "all") or (value.isdigit() and int(value) >= 1):
+        return value
+    raise argparse.ArgumentTypeError("must be latest, all, or a Prompt number")
+
+
+def handle_email_command(args: argparse.Namespace) -> bool:
+    if args.start is None and (args.end or args.select or args.dry_run):
+        parser_email.error(
+            "--end, --select, and --dry-run can only be used with --start"
+        )
+    return get_task_main("email").main(args)  # type: ignore
 
 
 def handle_schedule_command(args: argparse.Namespace) -> bool:
+    if args.adaptive and not (args.prompt or args.all):
+        parser_schedule.error("--adaptive can only be used with --prompt or --all")
+
+    if args.all:
+        logging.info("Starting all scheduled tasks...")
+        return get_task_main("daemon").main(adaptive=args.adaptive)  # type: ignore
+
+    if args.stream:
+        logging.info("Starting streamed Prompt detection...")
+        return get_task_main("stream").main()  # type: ignore
+
+    if args.prompt and args.adaptive:
+        logging.info("Starting adaptive Prompt fetch...")
+        return get_task_main("polling").schedule()  # type: ignore
+
     if args.prompt:
         logging.info("Starting scheduled Prompt fetch...")
         return get_task_main("fetch").schedule()  # type: ignore
@@ -43,15 +98,71 @@ subparsers = parser.add_subparsers()
 
 # Archive file generation
 parser_archive = subparsers.add_parser("archive", help="archive help")
-parser_archive.set_defaults(func=get_task_main("archive").main)  # type: ignore
+parser_archive.set_defaults(func=lazy_task("archive"))
 
 # Static file backup
 parser_backup = subparsers.add_parser("backup", help="backup help")
-parser_backup.set_defaults(func=get_task_main("backup").main)  # type: ignore
+group_backup = parser_backup.add_mutually_exclusive_group()
+group_backup.add_argument(
+    "--full",
+    help="back up every image instead of only new and changed images.",
+    action="store_true",
+)
+group_backup.add_argument(
+    "--restore",
+    help="restore the images from the latest backup chain into a directory.",
+    metavar="DEST",
+    type=Path,
+)
+parser_backup.set_defaults(func=lazy_task("backup"))
 
 # Notif email sending
 parser_email = subparsers.add_parser("email", help="email help")
-parser_email.set_defaults(func=get_task_main("email").main)  # type: ignore
+parser_email.add_argument(
+    "--start",
+    help="send without asking, for every date from START (YYYY-MM-DD).",
+    type=date.fromisoformat,
+)
+parser_email.add_argument(
+    "--end",
+    help="with --start, the last date to send for (default: START).",
+    type=date.fromisoformat,
+)
+parser_email.add_argument(
+    "--select",
+    help=(
+        "with --start, which Prompt to send for on days with more than one:"
+        " latest (default), all, or a Prompt number counting from 1."
+    ),
+    type=email_selection,
+)
+parser_email.add_argument(
+    "--dry-run",
+    help="with --start, only show which Prompts would be sent.",
+    action="store_true",
+)
+parser_email.set_defaults(func=handle_email_command)
+
+# Queued follow-up tasks
+parser_jobs = subparsers.add_parser("jobs", help="jobs help")
+parser_jobs.add_argument(
+    "--status",
+    help="show how many jobs are queued, finished, and failed.",
+    action="store_true",
+)
+parser_jobs.set_defaults(func=lazy_task("jobs"))
+
+# Local copies of Prompt media
+parser_media = subparsers.add_parser("media", help="media help")
+parser_media.add_argument(
+    "--backfill",
+    help="mirror the media of every Prompt between two dates (YYYY-MM-DD).",
+    nargs=2,
+    metavar=("START", "END"),
+    type=date.fromisoformat,
+    required=True,
+)
+parser_media.set_defaults(func=lazy_task("media"))
 
 # Prompt recording actions
 parser_prompt = subparsers.add_parser("prompt", help="prompt help")
@@ -62,6 +173,23 @@ group_prompt.add_argument(
     help="manually record a specific Prompt.",
     action="store_true",
 )
+group_prompt.add_argument(
+    "--backfill",
+    help="record all missing Prompts between two dates (YYYY-MM-DD).",
+    nargs=2,
+    metavar=("START", "END"),
+    type=date.fromisoformat,
+)
+parser_prompt.add_argument(
+    "--from",
+    help=(
+        "with --manual, record every Prompt in a CSV or JSON lines file with date, url,"
+        " and optional additional, notify, and archive (y/N) fields."
+    ),
+    dest="from_file",
+    metavar="FILE",
+    type=Path,
+)
 parser_prompt.set_defaults(func=handle_prompt_command)
 
 # Scheduled tasks
@@ -79,11 +207,30 @@ group_schedule.add_argument(
     help="schedule a backup of Prompt images.",
     action="store_true",
 )
+group_schedule.add_argument(
+    "-s",
+    "--stream",
+    help="record the Prompt as soon as it is sent using the Twitter filtered stream.",
+    action="store_true",
+)
+group_schedule.add_argument(
+    "-a",
+    "--all",
+    help="run every scheduled task in a single process.",
+    action="store_true",
+)
+parser_schedule.add_argument(
+    "--adaptive",
+    help="with --prompt or --all, poll around when the Host usually sends the Prompt.",
+    action="store_true",
+)
 parser_schedule.set_defaults(func=handle_schedule_command)
 
-# Run the proper commands
-try:
+# Run the proper commands. Processes started to write backups import this
+# file too, and must not run the command again
+if __name__ == "__main__":
     args = parser.parse_args()
-    args.func(args)
-except AttributeError:
-    parser.print_help()
+    if hasattr(args, "func"):
+        args.func(args)
+    else:
+        parser.print_help()
@@ -1,44 +1,77 @@
-from functools import partial
-from typing import Any, Callable
+import atexit
+from itertools import count
+from time import sleep
+from typing import Any
 
 import httpx
-import sys_vars
 
+from src.core.api import _client, _retry
+from src.helpers import metrics
 
-__all__ = ["delete", "get", "post", "put"]
 
+__all__ = ["client", "close", "delete", "get", "post", "put"]
 
-def __create_auth_token() -> dict:
-    """Create HTTP header for accessing protected API endpoints."""
-    return {"Authorization": f"Bearer {sys_vars.get('API_AUTH_TOKEN')}"}
 
+# A single, long-lived client so connections are pooled and kept alive
+# across every request made during a run
+__CLIENT: httpx.Client | None = None
 
-def __make_request(method: Callable, url: str, **kwargs: Any) -> dict:
-    """Make a request to the API."""
-    kwargs["headers"] = __create_auth_token()
-    kwargs["timeout"] = None
-    r = method(url=url, **kwargs)
+
+def __make_request(method: str, url: str, **kwargs: Any) -> dict:
+    """Make a request to the API, trying again if it fails and that is safe."""
+    kwargs["headers"] = {**kwargs.get("headers", {}), **_client.create_auth_token()}
+    route = metrics.route(httpx.URL(url).path)
+    retrier = _retry.retrier(method, route)
+    for attempt in count(1):
+        retrier.check()
+        with metrics.span("api", method=method, route=route, attempt=attempt) as labels:
+            try:
+                r = client().request(method, url, **kwargs)
+            except httpx.TransportError as exc:
+                if (delay := retrier.retry_after(attempt, error=exc)) is None:
+                    raise
+                labels["error"] = exc.__class__.__name__
+            else:
+                labels.update(status=r.status_code, bytes=len(r.content))
+                if (delay := retrier.retry_after(attempt, response=r)) is None:
+                    break
+        sleep(delay)
     r.raise_for_status()
-    return r.json() if r.text else {}
+    return _client.loads(r.content) if r.content else {}
+
+
+def client() -> httpx.Client:
+    """Get the shared API client, creating it if needed."""
+    global __CLIENT
+    if __CLIENT is None or __CLIENT.is_closed:
+        __CLIENT = httpx.Client(**_client.options())
+    return __CLIENT
+
+
+@atexit.register
+def close() -> None:
+    """Close the shared API client and all of its pooled connections."""
+    global __CLIENT
+    if __CLIENT is not None:
+        __CLIENT.close()
+    __CLIENT = None
 
 
 def delete(url: str, **kwargs: Any) -> dict:
     """Helper function for performing a DELETE request."""
-    func = partial(httpx.request, method="DELETE")
-    func.__name__ = "delete"
-    return __make_request(func, url, **kwargs)
+    return __make_request("DELETE", url, **kwargs)
 
 
 def get(url: str, **kwargs: Any) -> dict:
     """Helper function for performing a GET request."""
-    return __make_request(httpx.get, url, **kwargs)
+    return __make_request("GET", url, **kwargs)
 
 
 def post(url: str, **kwargs: Any) -> dict:
     """Helper function for performing a POST request."""
-    return __make_request(httpx.post, url, **kwargs)
+    return __make_request("POST", url, **kwargs)
 
 
 def put(url: str, **kwargs: Any) -> dict:
     """Helper function for performing a PUT request."""
-    return __make_request(httpx.put, url, **kwargs)
+    return __make_request("PUT", url, **kwargs)
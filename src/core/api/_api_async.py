@@ -0,0 +1,76 @@
+import asyncio
+from itertools import count
+from typing import Any
+from weakref import WeakKeyDictionary
+
+import httpx
+
+from src.core.api import _client, _retry
+from src.helpers import metrics
+
+
+__all__ = ["aclose", "client", "delete", "get", "post", "put"]
+
+
+# An async client is bound to the event loop it was created in,
+# so each loop gets its own that must be closed with `aclose()`
+__CLIENTS: WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient] = (
+    WeakKeyDictionary()
+)
+
+
+async def __make_request(method: str, url: str, **kwargs: Any) -> dict:
+    """Make a request to the API, trying again if it fails and that is safe."""
+    kwargs["headers"] = {**kwargs.get("headers", {}), **_client.create_auth_token()}
+    route = metrics.route(httpx.URL(url).path)
+    retrier = _retry.retrier(method, route)
+    for attempt in count(1):
+        retrier.check()
+        with metrics.span("api", method=method, route=route, attempt=attempt) as labels:
+            try:
+                r = await client().request(method, url, **kwargs)
+            except httpx.TransportError as exc:
+                if (delay := retrier.retry_after(attempt, error=exc)) is None:
+                    raise
+                labels["error"] = exc.__class__.__name__
+            else:
+                labels.update(status=r.status_code, bytes=len(r.content))
+                if (delay := retrier.retry_after(attempt, response=r)) is None:
+                    break
+        await asyncio.sleep(delay)
+    r.raise_for_status()
+    return _client.loads(r.content) if r.content else {}
+
+
+def client() -> httpx.AsyncClient:
+    """Get the async API client for the running event loop, creating it if needed."""
+    loop = asyncio.get_running_loop()
+    if (loop_client := __CLIENTS.get(loop)) is None or loop_client.is_closed:
+        loop_client = __CLIENTS[loop] = httpx.AsyncClient(**_client.options())
+    return loop_client
+
+
+async def aclose() -> None:
+    """Close the running event loop's API client and all of its connections."""
+    if (loop_client := __CLIENTS.pop(asyncio.get_running_loop(), None)) is not None:
+        await loop_client.aclose()
+
+
+async def delete(url: str, **kwargs: Any) -> dict:
+    """Helper function for performing a DELETE request."""
+    return await __make_request("DELETE", url, **kwargs)
+
+
+async def get(url: str, **kwargs: Any) -> dict:
+    """Helper function for performing a GET request."""
+    return await __make_request("GET", url, **kwargs)
+
+
+async def post(url: str, **kwargs: Any) -> dict:
+    """Helper function for performing a POST request."""
+    return await __make_request("POST", url, **kwargs)
+
+
+async def put(url: str, **kwargs: Any) -> dict:
+    """Helper function for performing a PUT request."""
+    return await __make_request("PUT", url, **kwargs)
@@ -0,0 +1,71 @@
+import logging
+from importlib.util import find_spec
+from typing import Any
+
+import httpx
+import sys_vars
+
+# Decode responses with the faster `orjson` package if it is installed
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads  # type: ignore[assignment]
+
+
+__all__ = ["create_api_url", "create_auth_token", "loads", "options", "timeout"]
+
+
+log = logging.getLogger("vss365today-finder")
+
+
+def create_api_url(*args: str) -> str:
+    """Construct a URL to the given v2 API endpoint."""
+    endpoint = "/".join(args)
+    return f"{sys_vars.get('API_DOMAIN')}/v2/{endpoint}"
+
+
+def create_auth_token() -> dict:
+    """Create HTTP header for accessing protected API endpoints."""
+    return {"Authorization": f"Bearer {sys_vars.get('API_AUTH_TOKEN')}"}
+
+
+def __use_http2() -> bool:
+    """Determine if HTTP/2 can be used for API connections."""
+    if not sys_vars.get_bool("API_HTTP2", default=False):
+        return False
+
+    # HTTP/2 support in httpx requires the optional `h2` package
+    if find_spec("h2") is None:
+        log.warning("API_HTTP2 is enabled but `h2` is not installed. Using HTTP/1.1")
+        return False
+    return True
+
+
+def timeout(read: float | None) -> httpx.Timeout:
+    """Build the API connection timeouts around a read timeout.
+
+    A read timeout of `None` waits for a response however long it takes.
+    """
+    return httpx.Timeout(
+        connect=sys_vars.get_float("API_TIMEOUT_CONNECT", default=5.0),
+        read=read,
+        write=sys_vars.get_float("API_TIMEOUT_WRITE", default=30.0),
+        pool=sys_vars.get_float("API_TIMEOUT_POOL", default=5.0),
+    )
+
+
+def options() -> dict[str, Any]:
+    """Build the shared connection options for an API client.
+
+    The same options are used for both the sync and async clients
+    so every request made to the API behaves identically.
+    """
+    return {
+        "http2": __use_http2(),
+        "timeout": timeout(sys_vars.get_float("API_TIMEOUT_READ", default=60.0)),
+        "limits": httpx.Limits(
+            max_connections=sys_vars.get_int("API_MAX_CONNECTIONS", default=10),
+            max_keepalive_connections=sys_vars.get_int("API_MAX_KEEPALIVE", default=5),
+            keepalive_expiry=sys_vars.get_float("API_KEEPALIVE_EXPIRY", default=30.0),
+        ),
+    }
@@ -0,0 +1,251 @@
+import logging
+import random
+import threading
+from dataclasses import dataclass, fields
+from functools import cache
+from math import ceil
+from time import monotonic
+
+import httpx
+import sys_vars
+
+
+__all__ = ["Breaker", "CircuitOpenError", "Policy", "Retrier", "retrier"]
+
+
+log = logging.getLogger("vss365today-finder")
+
+# Methods that can be sent again without changing the result
+IDEMPOTENT_METHODS = frozenset(("DELETE", "GET", "HEAD", "OPTIONS", "PUT"))
+
+# Errors and responses that mean the API never acted on a request,
+# so any request can be sent again, even one that creates something
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+UNPROCESSED_STATUSES = frozenset((429, 503))
+
+# Retry settings for endpoints that differ from the defaults. Email broadcasts
+# go out even when the API drops the connection, so they are never resent
+DEFAULT_POLICIES: dict[str, dict] = {
+    "notifications": {"attempts": 1},
+}
+
+__LOCK = threading.Lock()
+__BREAKERS: dict[str, "Breaker"] = {}
+
+
+class CircuitOpenError(httpx.HTTPError):
+    """An endpoint has been failing, so requests to it aren't being sent."""
+
+    def __init__(self, name: str, wait: float) -> None:
+        super().__init__(
+            f"The API has been failing for {name}, not trying again for {ceil(wait)}s"
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class Policy:
+    """How requests to an endpoint are retried and when to stop sending them."""
+
+    # How many times a request is sent before giving up
+    attempts: int = 3
+
+    # The longest wait before the first retry, doubling for each retry after
+    backoff: float = 0.5
+    max_backoff: float = 10.0
+
+    # Responses that are worth trying again, besides connection errors
+    statuses: frozenset[int] = frozenset((429, 502, 503, 504))
+
+    # How many failures in a row stop requests, and for how long
+    breaker_threshold: int = 5
+    breaker_reset: float = 30.0
+
+    @classmethod
+    def from_config(cls, config: dict) -> "Policy":
+        """Create a policy from the settings that differ from the defaults."""
+        if unknown := set(config) - {f.name for f in fields(cls)}:
+            raise ValueError(
+                f"Unknown API retry settings: {', '.join(sorted(unknown))}"
+            )
+        if "statuses" in config:
+            config = {**config, "statuses": frozenset(config["statuses"])}
+        return cls(**config)
+
+    def delay(self, attempt: int, response: httpx.Response | None) -> float | None:
+        """Get how long to wait before sending a request again.
+
+        The wait is random so clients that failed together don't retry together.
+        Gives back nothing if the API asked for a longer wait than is allowed.
+        """
+        if response is not None and "retry-after" in response.headers:
+            try:
+                wait = float(response.headers["retry-after"])
+            except ValueError:
+                pass
+            else:
+                return wait if wait <= self.max_backoff else None
+        return random.uniform(
+            0, min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+        )
+
+
+class Breaker:
+    """Stop sending requests to an endpoint while it keeps failing.
+
+    After the reset time, one request is let through to check if the endpoint
+    has recovered. Any other requests wait for the result of that one.
+    """
+
+    def __init__(self, name: str, threshold: int, reset: float) -> None:
+        self.name = name
+        self.threshold = threshold
+        self.reset = reset
+        self.failures = 0
+        self.opened: float | None = None
+        self.lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """Determine if requests are being stopped."""
+        return self.opened is not None
+
+    def check(self) -> None:
+        """Make sure a request can be sent."""
+        with self.lock:
+            if self.opened is None:
+                return
+            if (waited := monotonic() - self.opened) < self.reset:
+                raise CircuitOpenError(self.name, self.reset - waited)
+
+            # Hold the rest back until this request shows how the endpoint is
+            self.opened = monotonic()
+
+    def success(self) -> None:
+        """Record a request that got an answer."""
+        with self.lock:
+            if self.opened is not None:
+                log.info(f"The API is answering {self.name} again, sending requests")
+            self.failures = 0
+            self.opened = None
+
+    def failure(self) -> None:
+        """Record a request that failed, stopping requests if it keeps happening."""
+        with self.lock:
+            self.failures += 1
+            if self.opened is None and self.failures < self.threshold:
+                return
+            self.opened = monotonic()
+            log.error(
+                f"The API failed {self.failures} times in a row for {self.name},"
+                f" not sending requests for {self.reset:g}s"
+            )
+
+
+@cache
+def __policies() -> dict[str, Policy]:
+    """Get the retry policies set for specific endpoints or groups of endpoints."""
+    config = {**DEFAULT_POLICIES, **sys_vars.get_json("API_RETRY_POLICIES", default={})}
+    return {name: Policy.from_config(policy) for name, policy in config.items()}
+
+
+def __find_policy(route: str) -> tuple[str, Policy]:
+    """Get the retry policy for an endpoint and the name it was set for."""
+    # The most specific policy wins: the endpoint, then its group, then the default
+    endpoint = route.removeprefix("/v2/")
+    group = endpoint.split("/", 1)[0]
+    policies = __policies()
+    for name in (endpoint, group):
+        if name in policies:
+            return name, policies[name]
+    return group, Policy()
+
+
+def __get_breaker(name: str, policy: Policy) -> "Breaker":
+    """Get the circuit breaker shared by every request using a policy."""
+    with __LOCK:
+        if (breaker := __BREAKERS.get(name)) is None:
+            breaker = __BREAKERS[name] = Breaker(
+                name, policy.breaker_threshold, policy.breaker_reset
+            )
+    return breaker
+
+
+@dataclass(frozen=True, slots=True)
+class Retrier:
+    """Decide whether each attempt at a request is tried again."""
+
+    method: str
+    route: str
+    policy: Policy
+    breaker: Breaker
+    idempotent: bool
+
+    def check(self) -> None:
+        """Make sure the request can be sent."""
+        self.breaker.check()
+
+    def retry_after(
+        self,
+        attempt: int,
+        response: httpx.Response | None = None,
+        error: Exception | None = None,
+    ) -> float | None:
+        """Record how an attempt went and get how long to wait to try again.
+
+        Gives back nothing if the request shouldn't be tried again.
+        """
+        # Only a missing or broken API counts against it, not a bad request
+        if error is not None or (response is not None and response.status_code >= 500):
+            self.breaker.failure()
+        else:
+            self.breaker.success()
+
+        if error is None and response is not None:
+            if response.status_code not in self.policy.statuses:
+                return None
+        if not self.__can_retry(response, error):
+            return None
+        if attempt >= self.policy.attempts or self.breaker.is_open:
+            return None
+        if (delay := self.policy.delay(attempt, response)) is None:
+            return None
+
+        if error is not None:
+            reason = error.__class__.__name__
+        else:
+            assert response is not None
+            reason = str(response.status_code)
+        log.warning(
+            f"Retrying {self.method} {self.route} in {delay:.2f}s after {reason}"
+            f" (attempt {attempt} of {self.policy.attempts})"
+        )
+        return delay
+
+    def __can_retry(
+        self, response: httpx.Response | None, error: Exception | None
+    ) -> bool:
+        """Determine if sending the request again can't do something twice."""
+        if self.idempotent:
+            return True
+
+        # Anything else, such as creating a Prompt, is only sent again
+        # if it is certain the API didn't get it or didn't act on it
+        if error is not None:
+            return isinstance(error, UNSENT_ERRORS)
+        return response is not None and response.status_code in UNPROCESSED_STATUSES
+
+
+def retrier(method: str, route: str) -> Retrier:
+    """Get what decides how a request to an endpoint is retried.
+
+    Requests using an idempotent method are always safe to send twice.
+    Any other request is only retried if the API never acted on it.
+    """
+    name, policy = __find_policy(route)
+    return Retrier(
+        method=method,
+        route=route,
+        policy=policy,
+        breaker=__get_breaker(name, policy),
+        idempotent=method in IDEMPOTENT_METHODS,
+    )
@@ -0,0 +1,77 @@
+import sqlite3
+from contextlib import closing
+from json import dumps
+from time import time
+from typing import Any
+
+import sys_vars
+
+from src.core.api import _client
+from src.helpers import database
+
+
+__all__ = ["create_key", "invalidate", "load", "save", "ttl"]
+
+
+# How long (in seconds) a response from each endpoint can be reused.
+# Endpoints not listed here are never cached
+DEFAULT_TTLS = {
+    "hosts/current": 900,
+    "prompts/": 600,
+}
+
+
+def __connect() -> sqlite3.Connection:
+    """Connect to the API response cache database."""
+    conn = database.connect("cache")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS responses ("
+        "key TEXT PRIMARY KEY, endpoint_group TEXT NOT NULL, "
+        "value TEXT NOT NULL, expires REAL NOT NULL)"
+    )
+    return conn
+
+
+def __group(endpoint: str) -> str:
+    """Get the group of related endpoints an endpoint belongs to."""
+    return endpoint.split("/", 1)[0]
+
+
+def ttl(endpoint: str) -> int:
+    """Get how long a response from an endpoint can be cached, if at all."""
+    ttls = {**DEFAULT_TTLS, **sys_vars.get_json("API_CACHE_TTLS", default={})}
+    return int(ttls.get(endpoint, 0))
+
+
+def create_key(endpoint: str, params: Any = None) -> str:
+    """Create a cache key for a request to an endpoint."""
+    return f"{endpoint}?{dumps(params, sort_keys=True)}"
+
+
+def load(key: str) -> Any:
+    """Get a cached response, if it exists and has not expired."""
+    with closing(__connect()) as conn, conn:
+        row = conn.execute(
+            "SELECT value FROM responses WHERE key = ? AND expires > ?",
+            (key, time()),
+        ).fetchone()
+    return _client.loads(row[0]) if row is not None else None
+
+
+def save(key: str, endpoint: str, value: Any, ttl: int) -> None:
+    """Cache a response for the given number of seconds."""
+    with closing(__connect()) as conn, conn:
+        # Clean out anything that has already expired while we're here
+        conn.execute("DELETE FROM responses WHERE expires <= ?", (time(),))
+        conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+            (key, __group(endpoint), dumps(value), time() + ttl),
+        )
+
+
+def invalidate(endpoint: str) -> None:
+    """Remove every cached response related to an endpoint."""
+    with closing(__connect()) as conn, conn:
+        conn.execute(
+            "DELETE FROM responses WHERE endpoint_group = ?", (__group(endpoint),)
+        )
@@ -1,38 +1,50 @@
 from typing import Any
 
-import sys_vars
-
-from src.core.api import _api
+from src.core.api import _api, _client, cache
 
 
 __all__ = ["delete", "get", "post", "put"]
 
 
-def __create_api_url(*args: str) -> str:
-    """Construct a URL to the given v2 API endpoint."""
-    endpoint = "/".join(args)
-    return f"{sys_vars.get('API_DOMAIN')}/v2/{endpoint}"
-
-
 def delete(*args: str, **kwargs: Any) -> dict:
     """Helper function for performing a DELETE request."""
-    url = __create_api_url(*args)
-    return _api.delete(url, **kwargs)
+    url = _client.create_api_url(*args)
+    r = _api.delete(url, **kwargs)
+    cache.invalidate("/".join(args))
+    return r
 
 
 def get(*args: str, **kwargs: Any) -> dict:
-    """Helper function for performing a GET request."""
-    url = __create_api_url(*args)
-    return _api.get(url, **kwargs)
+    """Helper function for performing a GET request.
+
+    Responses from slowly-changing endpoints are cached according to their TTL.
+    """
+    url = _client.create_api_url(*args)
+    endpoint = "/".join(args)
+    if not (ttl := cache.ttl(endpoint)):
+        return _api.get(url, **kwargs)
+
+    # Try to reuse a recent response before asking the API
+    key = cache.create_key(endpoint, kwargs.get("params"))
+    if (r := cache.load(key)) is not None:
+        return r
+
+    r = _api.get(url, **kwargs)
+    cache.save(key, endpoint, r, ttl)
+    return r
 
 
 def post(*args: str, **kwargs: Any) -> dict:
     """Helper function for performing a POST request."""
-    url = __create_api_url(*args)
-    return _api.post(url, **kwargs)
+    url = _client.create_api_url(*args)
+    r = _api.post(url, **kwargs)
+    cache.invalidate("/".join(args))
+    return r
 
 
 def put(*args: str, **kwargs: Any) -> dict:
     """Helper function for performing a PUT request."""
-    url = __create_api_url(*args)
-    return _api.put(url, **kwargs)
+    url = _client.create_api_url(*args)
+    r = _api.put(url, **kwargs)
+    cache.invalidate("/".join(args))
+    return r
@@ -0,0 +1,139 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from contextvars import copy_context
+from typing import Any, Coroutine, TypeVar
+
+from httpx import HTTPStatusError
+
+from src.core.api import _api_async, _client, cache
+
+
+__all__ = ["delete", "get", "get_if_found", "post", "put", "run", "start", "stop"]
+
+
+T = TypeVar("T")
+
+# The event loop shared by every run in a long-running process, if started
+__LOOP: asyncio.AbstractEventLoop | None = None
+__THREAD: threading.Thread | None = None
+
+
+async def delete(*args: str, **kwargs: Any) -> dict:
+    """Helper function for performing a DELETE request."""
+    url = _client.create_api_url(*args)
+    r = await _api_async.delete(url, **kwargs)
+    cache.invalidate("/".join(args))
+    return r
+
+
+async def get(*args: str, **kwargs: Any) -> dict:
+    """Helper function for performing a GET request.
+
+    Responses from slowly-changing endpoints are cached according to their TTL.
+    """
+    url = _client.create_api_url(*args)
+    endpoint = "/".join(args)
+    if not (ttl := cache.ttl(endpoint)):
+        return await _api_async.get(url, **kwargs)
+
+    # Try to reuse a recent response before asking the API
+    key = cache.create_key(endpoint, kwargs.get("params"))
+    if (r := cache.load(key)) is not None:
+        return r
+
+    r = await _api_async.get(url, **kwargs)
+    cache.save(key, endpoint, r, ttl)
+    return r
+
+
+async def get_if_found(*args: str, **kwargs: Any) -> dict | None:
+    """Helper function for performing a GET request for something that may not exist.
+
+    Gives back nothing if the API says it wasn't found.
+    """
+    try:
+        return await get(*args, **kwargs)
+    except HTTPStatusError as exc:
+        if exc.response.status_code == 404:
+            return None
+        raise
+
+
+async def post(*args: str, **kwargs: Any) -> dict:
+    """Helper function for performing a POST request."""
+    url = _client.create_api_url(*args)
+    r = await _api_async.post(url, **kwargs)
+    cache.invalidate("/".join(args))
+    return r
+
+
+async def put(*args: str, **kwargs: Any) -> dict:
+    """Helper function for performing a PUT request."""
+    url = _client.create_api_url(*args)
+    r = await _api_async.put(url, **kwargs)
+    cache.invalidate("/".join(args))
+    return r
+
+
+def run(coro: Coroutine[Any, Any, T]) -> T:
+    """Run a coroutine that uses the async API.
+
+    Once `start()` has been called, the coroutine runs on the shared event loop
+    and its API client is kept open. Otherwise it gets its own event loop
+    and client that are closed afterward.
+    """
+    if (loop := __LOOP) is None:
+
+        async def runner() -> T:
+            try:
+                return await coro
+            finally:
+                await _api_async.aclose()
+
+        return asyncio.run(runner())
+
+    # Run in a copy of the caller's context so its requests are still measured
+    done: Future[T] = Future()
+    context = copy_context()
+
+    def finish(task: asyncio.Task) -> None:
+        if task.cancelled():
+            done.cancel()
+        elif (exc := task.exception()) is not None:
+            done.set_exception(exc)
+        else:
+            done.set_result(task.result())
+
+    def begin() -> None:
+        loop.create_task(coro, context=context).add_done_callback(finish)
+
+    loop.call_soon_threadsafe(begin)
+    return done.result()
+
+
+def start() -> None:
+    """Share one event loop and API client between every run from now on.
+
+    The loop runs in a background thread until `stop()` is called, so
+    a long-running process keeps its API connections warm between runs.
+    """
+    global __LOOP, __THREAD
+    if __LOOP is not None:
+        return
+    __LOOP = asyncio.new_event_loop()
+    __THREAD = threading.Thread(target=__LOOP.run_forever, name="v2-async", daemon=True)
+    __THREAD.start()
+
+
+def stop() -> None:
+    """Close the shared API client and stop the shared event loop."""
+    global __LOOP, __THREAD
+    if (loop := __LOOP) is None:
+        return
+    asyncio.run_coroutine_threadsafe(_api_async.aclose(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    if __THREAD is not None:
+        __THREAD.join()
+    loop.close()
+    __LOOP = __THREAD = None
@@ -4,10 +4,12 @@ import sys_vars
 from httpx import HTTPError
 
 from src.core.api import v2
+from src.helpers import metrics
 
 __all__ = ["main"]
 
 
+@metrics.run("archive")
 def main(args: Namespace) -> bool:
     """Generate a Prompt archive file."""
     try:
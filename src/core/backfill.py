@@ -0,0 +1,203 @@
+import asyncio
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from datetime import date, datetime, time, timedelta
+from uuid import uuid4
+
+import sys_vars
+from httpx import HTTPError
+from pytz import utc
+from requests import RequestException
+from tweepy import Paginator, TweepyException
+
+from src.core import jobs, record
+from src.core.api import v2_async
+from src.helpers import metrics, periods, ratelimit, tweet
+from src.helpers.candidate import PromptCandidate
+from src.helpers.models import Host, Prompt
+
+__all__ = ["main"]
+
+
+async def __get_recorded(prompt_date: date) -> list[Prompt]:
+    """Get the Prompts already recorded for a date."""
+    prompts = await v2_async.get_if_found("prompts", "date", prompt_date.isoformat())
+    if not prompts:
+        return []
+    return [
+        Prompt.from_api(data)
+        for data in (prompts if isinstance(prompts, list) else [prompts])
+    ]
+
+
+async def __get_host(prompt_date: date) -> Host | None:
+    """Get the Host for a date, if there is one."""
+    host = await v2_async.get_if_found("hosts", "date", prompt_date.isoformat())
+
+    # Some periods have had more than one Host. Use the first listed
+    if isinstance(host, list):
+        host = host[0] if host else None
+    return Host.from_api(host) if host else None
+
+
+async def __find_missing(
+    dates: list[date], limit: int
+) -> tuple[dict[date, Host | None], set[str]]:
+    """Find every date without a recorded Prompt and who hosted it.
+
+    Also gives back the tweets already recorded as Prompts, including the day
+    before the first date, so they aren't recorded again for another day.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def check(prompt_date: date) -> tuple[date, list[Prompt], Host | None]:
+        async with semaphore:
+            if prompts := await __get_recorded(prompt_date):
+                return prompt_date, prompts, None
+            return prompt_date, [], await __get_host(prompt_date)
+
+    results, day_before = await asyncio.gather(
+        asyncio.gather(*[check(d) for d in dates]),
+        __get_recorded(dates[0] - timedelta(days=1)),
+    )
+    missing = {d: host for d, prompts, host in results if not prompts}
+    recorded = {p.twitter_id for _, prompts, _ in results for p in prompts}
+    recorded.update(p.twitter_id for p in day_before)
+    return missing, recorded
+
+
+def __scan_host(
+    uid: str, dates: list[date], recorded: set[str]
+) -> dict[date, PromptCandidate]:
+    """Find the Prompts a Host tweeted for the given dates.
+
+    A Prompt for a day is the oldest Prompt tweet a fetch on that day would
+    have recorded for it, skipping tweets recorded or used for another day.
+    """
+    # A Prompt could have been sent as early as the day before the first date
+    start_time = datetime.combine(dates[0] - timedelta(days=1), time.min, tzinfo=utc)
+    end_time = datetime.combine(dates[-1] + timedelta(days=1), time.min, tzinfo=utc)
+
+    # Collect every Prompt tweet, newest first
+    candidates: list[PromptCandidate] = []
+    oldest_seen: date | None = end_time.date()
+    try:
+        for response in tweet.flatten(
+            Paginator(
+                tweet.twitter_v2_api().get_users_tweets,
+                id=uid,
+                max_results=100,
+                exclude=["replies", "retweets"],
+                start_time=start_time,
+                end_time=end_time,
+                **tweet.fetch_fields(),
+            )
+        ):
+            oldest_seen = response.data.created_at.date()
+            if tweet.get_prompt(response) is not None:
+                candidates.append(PromptCandidate.from_tweet(response))
+        oldest_seen = None
+
+    # Keep whatever was found before the limit was reached. Timelines are
+    # newest first, so only the day the scan stopped on and the days before
+    # it are incomplete, and those are left to a later backfill
+    except ratelimit.RateLimited as exc:
+        print(exc)
+
+    found = {}
+    used = set(recorded)
+    for prompt_date in sorted(set(dates)):
+        if oldest_seen is not None and prompt_date <= oldest_seen:
+            continue
+        for candidate in reversed(candidates):
+            if (
+                candidate.id not in used
+                and candidate.date_for(prompt_date) == prompt_date
+            ):
+                found[prompt_date] = candidate
+                used.add(candidate.id)
+                break
+    return found
+
+
+@metrics.run("backfill")
+def main(start: date, end: date) -> bool:
+    """Recover every missing Prompt between two dates."""
+    # Cutoff date
+    if date.today() >= date(2024, 1, 1):
+        print("Today is on or after January 1, 2024. Refusing to run.")
+        return True
+
+    workers = sys_vars.get_int("BACKFILL_WORKERS", default=4)
+    dates = periods.days(start, end)
+    if not dates:
+        print(f"{start} is after {end}. Nothing to do.")
+        return False
+
+    # Work out what needs to be recovered
+    print(f"Checking {len(dates)} days for missing Prompts...")
+    try:
+        missing, recorded_ids = v2_async.run(__find_missing(dates, workers))
+    except HTTPError as exc:
+        print("Unable to determine which Prompts are missing!")
+        print(f"{exc.__class__.__name__}: {exc}")
+        return False
+
+    # Group the missing dates by who hosted them so each timeline is read once
+    hosts: dict[str, list[date]] = defaultdict(list)
+    for prompt_date, host in missing.items():
+        if host is not None:
+            hosts[host.twitter_uid].append(prompt_date)
+
+    # Scan every Host's timeline at the same time
+    print(f"Searching {len(hosts)} Host timeline(s) for {len(missing)} Prompt(s)...")
+    found: dict[date, PromptCandidate] = {}
+    unsearched: set[date] = set()
+    # Each scan runs in a copy of this run's context so its requests are measured
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            uid: executor.submit(
+                copy_context().run, __scan_host, uid, host_dates, recorded_ids
+            )
+            for uid, host_dates in hosts.items()
+        }
+
+        # One Host's timeline failing shouldn't lose what was found for the rest
+        for uid, future in futures.items():
+            try:
+                found.update(future.result())
+            except (HTTPError, RequestException, TweepyException) as exc:
+                print(f"Unable to search the timeline of Host {uid}!")
+                print(f"{exc.__class__.__name__}: {exc}")
+                unsearched.update(hosts[uid])
+
+    # Record everything we found, without emailing anyone about old Prompts
+    prompts = {d: (candidate.to_prompt(d), False) for d, candidate in found.items()}
+    recorded = v2_async.run(record.record_all(prompts, workers)) if prompts else {}
+
+    # Regenerate the archive once for everything that was recorded,
+    # after all of their media has been recorded
+    if any(recorded.values()):
+        jobs.drain()
+        jobs.enqueue("archive", {}, key=f"archive:backfill:{uuid4().hex}")
+        jobs.drain()
+
+    # Report how each day went
+    print("\nBackfill results:")
+    for prompt_date in dates:
+        if prompt_date not in missing:
+            result = "already recorded"
+        elif missing[prompt_date] is None:
+            result = "no Host found"
+        elif prompt_date in unsearched:
+            result = "Host timeline not searched"
+        elif prompt_date not in found:
+            result = "Prompt not found"
+        elif recorded[prompt_date]:
+            result = f"recorded {found[prompt_date].word}"
+        else:
+            result = "failed to record"
+        print(f"{prompt_date.isoformat()}: {result}")
+
+    return all(recorded.values()) and len(found) == len(missing)
@@ -1,33 +1,222 @@
+import multiprocessing
 from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from os import fspath
+from itertools import repeat
+from json import dumps, loads
+from os import cpu_count, fspath, replace
+from pathlib import Path
+from time import perf_counter
+from typing import Any
 
 import py7zr
 import sys_vars
-from apscheduler.schedulers.blocking import BlockingScheduler
 from pytz import utc
 
+from src.helpers import files
 
-__all__ = ["main", "schedule"]
 
+__all__ = ["main", "register", "restore", "schedule"]
+
+
+MANIFEST_NAME = "vss365today_images_manifest.json"
+
+# Image formats that are already compressed and are stored as-is
+ALREADY_COMPRESSED = frozenset((".avif", ".gif", ".jpeg", ".jpg", ".png", ".webp"))
+
+
+def __load_manifest(backup_dir: Path) -> dict:
+    """Load the record of every file and archive in the backup chain."""
+    manifest_file = backup_dir / MANIFEST_NAME
+    if not manifest_file.exists():
+        return {"files": {}, "chain": []}
+    return loads(manifest_file.read_text())
+
+
+def __save_manifest(backup_dir: Path, manifest: dict) -> None:
+    """Save the backup manifest, replacing it atomically."""
+    manifest_file = backup_dir / MANIFEST_NAME
+    tmp_file = manifest_file.with_suffix(".json.tmp")
+    tmp_file.write_text(dumps(manifest, indent=2))
+    replace(tmp_file, manifest_file)
+
+
+def __scan_images(images_dir: Path, previous: dict[str, dict]) -> dict[str, dict]:
+    """Record the size, modification time, and content hash of every image.
+
+    Files whose size and modification time haven't changed since the last
+    backup reuse their previous hash instead of being read again.
+    """
+    images = {}
+    for path in sorted(p for p in images_dir.rglob("*") if p.is_file()):
+        name = path.relative_to(images_dir).as_posix()
+        stat = path.stat()
+        entry: dict[str, Any] = {"size": stat.st_size, "mtime": stat.st_mtime}
+
+        old = previous.get(name, {})
+        if old.get("size") == entry["size"] and old.get("mtime") == entry["mtime"]:
+            entry["sha256"] = old["sha256"]
+        else:
+            entry["sha256"] = files.hash_file(path)
+        images[name] = entry
+    return images
+
+
+def __filters(name: str) -> list[dict]:
+    """Pick how an image should be compressed in an archive."""
+    # Most images are already compressed, so trying again only wastes time
+    if Path(name).suffix.lower() in ALREADY_COMPRESSED:
+        return [{"id": py7zr.FILTER_COPY}]
+    return [{"id": py7zr.FILTER_LZMA2, "preset": 1}]
+
+
+def __plan_shards(images_dir: Path, names: list[str]) -> list[list[str]]:
+    """Split the images into shards of about `BACKUP_SHARD_MB` each.
+
+    Images are grouped by how they are compressed, since each archive
+    can only use a single set of filters.
+    """
+    shard_bytes = sys_vars.get_int("BACKUP_SHARD_MB", default=512) * 1024 * 1024
+    groups: dict[str, list[str]] = {}
+    for name in names:
+        groups.setdefault(str(__filters(name)), []).append(name)
+
+    shards = []
+    for group in groups.values():
+        shard: list[str] = []
+        size = 0
+        for name in group:
+            if shard and size >= shard_bytes:
+                shards.append(shard)
+                shard, size = [], 0
+            shard.append(name)
+            size += (images_dir / name).stat().st_size
+        shards.append(shard)
+    return shards
+
+
+def __write_shard(backup_file: Path, images_dir: Path, names: list[str]) -> tuple:
+    """Write a shard of images into an archive, streaming each file from disk."""
+    start = perf_counter()
+    with py7zr.SevenZipFile(
+        fspath(backup_file), "w", filters=__filters(names[0])
+    ) as archive:
+        for name in names:
+            archive.write(images_dir / name, arcname=name)
+
+    size = sum((images_dir / name).stat().st_size for name in names)
+    return backup_file.name, size, perf_counter() - start
+
+
+def __write_archive(backup_file: Path, images_dir: Path, names: list[str]) -> list:
+    """Write the given images into one or more archives, in parallel if possible."""
+    shards = __plan_shards(images_dir, names)
+
+    # Number every archive if there is more than one of them
+    if len(shards) == 1:
+        shard_files = [backup_file]
+    else:
+        shard_files = [
+            backup_file.with_name(f"{backup_file.stem}_{i:03}.7z")
+            for i in range(1, len(shards) + 1)
+        ]
+
+    # A single shard doesn't need the overhead of extra processes
+    workers = min(sys_vars.get_int("BACKUP_WORKERS", default=cpu_count() or 1), 64)
+    if len(shards) == 1 or workers <= 1:
+        results = list(map(__write_shard, shard_files, repeat(images_dir), shards))
+    else:
+        # Forking a process that is running threads, such as the daemon, can
+        # leave the workers stuck on a lock, so start them fresh instead
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context(
+            "forkserver" if "forkserver" in methods else "spawn"
+        )
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(shards)), mp_context=context
+        ) as executor:
+            results = list(
+                executor.map(__write_shard, shard_files, repeat(images_dir), shards)
+            )
+
+    for name, size, seconds in results:
+        throughput = size / 1024 / 1024 / max(seconds, 1e-9)
+        print(f"{name}: {size / 1024 / 1024:.1f} MB in {seconds:.2f}s", end="")
+        print(f" ({throughput:.1f} MB/s)")
+    return [name for name, *_ in results]
+
+
+def __backups_since_full(chain: list[dict]) -> int:
+    """Count the delta backups made since the last full backup."""
+    count = 0
+    for entry in reversed(chain):
+        if entry["type"] == "full":
+            return count
+        count += 1
+    return count
+
+
+def __last_full(chain: list[dict]) -> int:
+    """Find the position of the last full backup in the chain."""
+    for i, entry in reversed(list(enumerate(chain))):
+        if entry["type"] == "full":
+            return i
+    raise ValueError("There is no full backup to restore from")
+
+
+def main(args: Namespace | None = None) -> bool:
+    """Create a backup of all Prompt images.
+
+    Only images that are new or have changed since the last backup are archived,
+    with a full backup made every `BACKUP_FULL_EVERY` backups.
+    """
+    if args is not None and getattr(args, "restore", None):
+        return restore(args.restore)
 
-def main(*args: Namespace) -> bool:
-    """Create an archive backup of all Prompt images."""
     print("Creating backup of Prompt images...")
+    backup_dir = sys_vars.get_path("BACKUP_DIR")
+    images_dir = sys_vars.get_path("IMAGES_DIR")
+    manifest = __load_manifest(backup_dir)
+
+    # Work out what the images look like right now
+    current = __scan_images(images_dir, manifest["files"])
+
+    # Decide if this should be a full backup
+    is_full = (
+        (args is not None and getattr(args, "full", False))
+        or __backups_since_full(manifest["chain"])
+        >= sys_vars.get_int("BACKUP_FULL_EVERY", default=4)
+        or not any(entry["type"] == "full" for entry in manifest["chain"])
+    )
+
+    # Only archive the files that are new or changed since the last backup
+    if is_full:
+        names = list(current)
+        deleted = []
+    else:
+        names = [
+            name
+            for name, entry in current.items()
+            if manifest["files"].get(name, {}).get("sha256") != entry["sha256"]
+        ]
+        deleted = sorted(set(manifest["files"]) - set(current))
+
+    # Nothing has changed since the last backup
+    if not names and not deleted:
+        print("No Prompt images have changed since the last backup")
+        manifest["files"] = current
+        __save_manifest(backup_dir, manifest)
+        return True
+
     # Create the archive name
     now = datetime.now().isoformat().replace(":", "-")
-    backup_file = (
-        sys_vars.get_path("BACKUP_DIR") / f"vss365today_images_{now}.7z"
-    ).resolve()
+    suffix = "" if is_full else "_delta"
+    backup_file = (backup_dir / f"vss365today_images_{now}{suffix}.7z").resolve()
 
     try:
-        # Attempt to create the archive
-        with py7zr.SevenZipFile(fspath(backup_file), "w") as archive:
-            # archname="" puts the files in the archive root
-            archive.writeall(sys_vars.get_path("IMAGES_DIR").as_posix(), arcname="")
-
-        print(f"{backup_file} successfully created")
-        return True
+        # Attempt to create the archive. A delta with only deleted files
+        # doesn't need an archive, only a record of what was deleted
+        archives = __write_archive(backup_file, images_dir, names) if names else []
 
     # Something happened and it failed
     except py7zr.exceptions.ArchiveError as exc:
@@ -35,10 +224,62 @@ def main(*args: Namespace) -> bool:
         print(exc)
         return False
 
+    # Record the backup in the chain
+    manifest["chain"].append({
+        "type": "full" if is_full else "delta",
+        "archives": archives,
+        "created": now,
+        "files": names,
+        "deleted": deleted,
+    })
+    manifest["files"] = current
+    __save_manifest(backup_dir, manifest)
 
-def schedule() -> None:
-    """Schedule the Prompt images backup."""
-    scheduler = BlockingScheduler()
+    kind = "Full" if is_full else "Incremental"
+    if names:
+        print(f"{kind} backup of {len(names)} image(s) created in {backup_dir}")
+    if deleted:
+        print(f"{len(deleted)} deleted image(s) recorded")
+    return True
+
+
+def restore(dest: Path) -> bool:
+    """Restore the Prompt images by merging the latest backup chain."""
+    backup_dir = sys_vars.get_path("BACKUP_DIR")
+    manifest = __load_manifest(backup_dir)
+    try:
+        chain = manifest["chain"][__last_full(manifest["chain"]) :]
+    except ValueError as exc:
+        print(f"Unable to restore Prompt images! {exc}")
+        return False
+
+    # Start from the last full backup and apply every delta on top of it
+    dest.mkdir(parents=True, exist_ok=True)
+    restored = set()
+    try:
+        for entry in chain:
+            for archive in entry["archives"]:
+                print(f"Restoring {archive}...")
+                with py7zr.SevenZipFile(fspath(backup_dir / archive)) as a:
+                    a.extractall(path=dest)
+            restored.update(entry["files"])
+            restored.difference_update(entry["deleted"])
+
+            # Remove anything this backup recorded as deleted
+            for name in entry["deleted"]:
+                (dest / name).unlink(missing_ok=True)
+
+    except py7zr.exceptions.ArchiveError as exc:
+        print("Unable to restore Prompt images!")
+        print(exc)
+        return False
+
+    print(f"Restored {len(restored)} image(s) from {len(chain)} backup(s) to {dest}")
+    return True
+
+
+def register(scheduler: Any) -> None:
+    """Add the weekly Prompt images backup to a scheduler."""
     scheduler.add_job(
         main,
         args=[],
@@ -48,4 +289,12 @@ def schedule() -> None:
         day_of_week="0",
         timezone=utc,
     )
+
+
+def schedule() -> None:
+    """Schedule the Prompt images backup."""
+    from apscheduler.schedulers.blocking import BlockingScheduler
+
+    scheduler = BlockingScheduler()
+    register(scheduler)
     scheduler.start()
@@ -0,0 +1,56 @@
+import signal
+import threading
+from importlib import import_module
+
+import sys_vars
+from pytz import utc
+
+from src.core.api import _api, v2_async
+
+__all__ = ["main"]
+
+
+def main(adaptive: bool = False) -> None:
+    """Run every scheduled task in a single long-running process.
+
+    Jobs run on a thread pool so a long backup doesn't hold up a Prompt fetch.
+    They all share the same pooled API and Twitter connections, and one event
+    loop for the async API so its connections are kept between jobs too.
+    """
+    from apscheduler.executors.pool import ThreadPoolExecutor
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    scheduler = BackgroundScheduler(
+        executors={
+            "default": ThreadPoolExecutor(sys_vars.get_int("DAEMON_WORKERS", default=4))
+        },
+        job_defaults={
+            # Run a job that was missed, such as while the process was busy,
+            # only once and never alongside itself
+            "coalesce": True,
+            "max_instances": 1,
+            "misfire_grace_time": sys_vars.get_int("DAEMON_MISFIRE_GRACE", default=300),
+        },
+        timezone=utc,
+    )
+
+    # Only load the tasks once we know which ones are being run
+    tasks = ("polling" if adaptive else "fetch", "backup")
+    for task in tasks:
+        import_module(f"src.core.{task}").register(scheduler)  # type: ignore
+
+    # Stop cleanly when the container is stopped
+    stopping = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stopping.set())
+
+    v2_async.start()
+    scheduler.start()
+    print(f"Running scheduled {', '.join(tasks)} tasks. Stop with SIGTERM or Ctrl+C.")
+    stopping.wait()
+
+    # Let any running jobs finish before closing their connections
+    print("Shutting down, waiting for running jobs to finish...")
+    scheduler.shutdown(wait=True)
+    v2_async.stop()
+    _api.close()
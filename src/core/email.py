@@ -1,20 +1,20 @@
+import asyncio
 from argparse import Namespace
 from contextlib import suppress
 from datetime import date
 
+import sys_vars
 from httpx import HTTPError, RemoteProtocolError
 
-from src.core.api import v2
+from src.core.api import _client, v2, v2_async
+from src.helpers import metrics, periods
+from src.helpers.models import Prompt
 
 __all__ = ["main"]
 
 
-def main(_: Namespace) -> bool:
-    # Cutoff date
-    if date.today() >= date(2024, 1, 1):
-        print("Today is on or after January 1, 2024. Refusing to run.")
-        return True
-
+def __ask_and_send() -> bool:
+    """Ask which Prompt to send an email broadcast for, then send it."""
     # Ask for the prompt date
     prompt_date = date.fromisoformat(
         input("Enter the Prompt date (YYYY-MM-DD): ").strip()
@@ -22,7 +22,10 @@ def main(_: Namespace) -> bool:
 
     try:
         # Fetch all Prompts for this date
-        available_prompts = v2.get("prompts", "date", prompt_date.isoformat())
+        available_prompts = [
+            Prompt.from_api(prompt)
+            for prompt in v2.get("prompts", "date", prompt_date.isoformat())
+        ]
 
         # By default, select the first/latest Prompt
         prompt_index = -1
@@ -35,7 +38,7 @@ def main(_: Namespace) -> bool:
                 "Which would you like to send a notification for?",
             )
             for i, prompt in enumerate(available_prompts):
-                print(f"[{i + 1}] {prompt['word']}")
+                print(f"[{i + 1}] {prompt.word}")
 
             # Ask for a prompt until we get a valid selection
             while True:
@@ -57,12 +60,14 @@ def main(_: Namespace) -> bool:
 
         # Send the email broadcast.
         # For some reason, this exception keeps getting raised
-        # despite the emails actually sending out, so suppress it
+        # despite the emails actually sending out, so suppress it.
+        # The broadcast takes as long as it takes, so wait for all of it
         with suppress(RemoteProtocolError):
             v2.post(
                 "notifications",
                 prompt_date.isoformat(),
                 params={"which": prompt_index},
+                timeout=_client.timeout(read=None),
             )
         print(f"Email broadcast for {prompt_date} successfully sent")
         return True
@@ -72,3 +77,96 @@ def main(_: Namespace) -> bool:
         print(f"Unable to send email broadcast for {prompt_date}!")
         print(f"{exc.__class__.__name__}: {exc}")
     return False
+
+
+async def __get_prompts(prompt_date: date) -> list[Prompt]:
+    """Get every Prompt recorded for a date."""
+    prompts = await v2_async.get_if_found("prompts", "date", prompt_date.isoformat())
+    return [Prompt.from_api(prompt) for prompt in prompts or []]
+
+
+def __select(prompts: list[Prompt], select: str) -> list[int]:
+    """Pick which of a day's Prompts to send an email broadcast for."""
+    if not prompts:
+        return []
+
+    # The latest Prompt is the same one picked when nothing is asked
+    if select == "latest":
+        return [-1]
+    if select == "all":
+        return list(range(len(prompts)))
+
+    # Prompts are numbered from 1, the same as when asking
+    index = int(select) - 1
+    return [index] if index < len(prompts) else []
+
+
+async def __send(
+    prompt_date: date, select: str, dry_run: bool, semaphore: asyncio.Semaphore
+) -> tuple[bool, str]:
+    """Send the selected email broadcasts for a date, giving back how it went."""
+    async with semaphore:
+        try:
+            prompts = await __get_prompts(prompt_date)
+            if not (selected := __select(prompts, select)):
+                return False, f"no Prompt to send ({len(prompts)} recorded)"
+            words = ", ".join(str(prompts[i].word) for i in selected)
+            if dry_run:
+                return True, f"would send {words}"
+
+            # For some reason, this exception keeps getting raised
+            # despite the emails actually sending out, so suppress it.
+            # The broadcast takes as long as it takes, so wait for all of it
+            for i in selected:
+                with suppress(RemoteProtocolError):
+                    await v2_async.post(
+                        "notifications",
+                        prompt_date.isoformat(),
+                        params={"which": i},
+                        timeout=_client.timeout(read=None),
+                    )
+            return True, f"sent {words}"
+
+        except HTTPError as exc:
+            return False, f"failed, {exc.__class__.__name__}: {exc}"
+
+
+async def __send_all(
+    dates: list[date], select: str, dry_run: bool, limit: int
+) -> list[tuple[bool, str]]:
+    """Send the email broadcasts for every date, a few at a time."""
+    semaphore = asyncio.Semaphore(limit)
+    return await asyncio.gather(
+        *[__send(prompt_date, select, dry_run, semaphore) for prompt_date in dates]
+    )
+
+
+@metrics.run("email")
+def main(args: Namespace) -> bool:
+    """Send email broadcasts, for a range of dates or for a date that is asked for."""
+    # Cutoff date
+    if date.today() >= date(2024, 1, 1):
+        print("Today is on or after January 1, 2024. Refusing to run.")
+        return True
+
+    if (start := getattr(args, "start", None)) is None:
+        return __ask_and_send()
+
+    end = getattr(args, "end", None) or start
+    dates = periods.days(start, end)
+    if not dates:
+        print(f"{start} is after {end}. Nothing to do.")
+        return False
+
+    dry_run = getattr(args, "dry_run", False)
+    select = getattr(args, "select", None) or "latest"
+    workers = sys_vars.get_int("EMAIL_WORKERS", default=4)
+    action = "Resolving" if dry_run else "Sending"
+    print(f"{action} email broadcasts for {len(dates)} day(s)...")
+    results = v2_async.run(__send_all(dates, select, dry_run, workers))
+
+    # Report how each day went
+    print("\nEmail broadcast results:")
+    for prompt_date, (_, result) in zip(dates, results):
+        print(f"{prompt_date.isoformat()}: {result}")
+    return all(is_sent for is_sent, _ in results)
@@ -1,47 +1,152 @@
-from contextlib import suppress
-from datetime import date, datetime, timedelta
+from datetime import date, datetime, time, timedelta
+from typing import Any, Iterable
 
 import sys_vars
-from apscheduler.schedulers.blocking import BlockingScheduler
-from httpx import HTTPError, RemoteProtocolError
+import tweepy
+from httpx import HTTPError
 from pytz import utc
 from tweepy import Paginator
 
-from src.core.api import v2
-from src.helpers import tweet
+from src.core import jobs, record
+from src.core.api import cache, v2, v2_async
+from src.helpers import config, metrics, periods, ratelimit, state, tweet, tweet_cache
+from src.helpers.candidate import PromptCandidate
+from src.helpers.models import Host, Prompt
 
-__all__ = ["main", "schedule"]
+__all__ = [
+    "date_to_record",
+    "find_prompt",
+    "main",
+    "record_candidate",
+    "register",
+    "scan_timeline",
+    "schedule",
+]
 
 
-# Connect to the Twitter API
-TWITTER_API = tweet.twitter_v2_api()
+def __hosting_period(today: date) -> str:
+    """Get the start date of the Hosting Period the given date falls in."""
+    return periods.hosting_period(today)[0].isoformat()
 
 
-def find_prompt(uid: str):
-    found_tweet = None
+def __load_cursor(uid: str, period: str) -> str | None:
+    """Get the newest tweet ID already seen from the Host this Hosting Period."""
+    cursor = state.load(f"cursor:{uid}", {})
 
-    # Get the tweets from the Host for the prompt
-    for response in Paginator(
-        TWITTER_API.get_users_tweets,
-        id=uid,
-        max_results=50,
-        exclude=["replies", "retweets"],
-        tweet_fields=["entities"],
-    ).flatten():
-        # Found the prompt!
-        if tweet.is_likely_prompt_tweet(response):
-            found_tweet = response
+    # The cursor is only useful for the period it was recorded in
+    if cursor.get("period") != period:
+        return None
+    return cursor.get("since_id")
+
+
+def __save_cursor(uid: str, period: str, since_id: str) -> None:
+    """Record the newest tweet ID seen from the Host."""
+    # Never go back to tweets that have already been looked at
+    if (seen := __load_cursor(uid, period)) is not None and int(seen) >= int(since_id):
+        return
+    state.save(f"cursor:{uid}", {"period": period, "since_id": since_id})
+
+
+def __load_candidate(uid: str, today: date) -> tweepy.Response | None:
+    """Get the Prompt tweet an earlier run today found but didn't record."""
+    candidate = state.load(f"candidate:{uid}", {})
+    if candidate.get("date") != today.isoformat():
+        return None
+    return tweet_cache.load(candidate["id"], tweet.fetch_fields())
+
+
+def __save_candidate(
+    uid: str, today: date, found_tweet: tweepy.Response | None
+) -> None:
+    """Remember the Prompt tweet found today in case it can't be recorded."""
+    if found_tweet is None:
+        state.save(f"candidate:{uid}", {})
+        return
+    tweet_cache.save(found_tweet, tweet.fetch_fields())
+    state.save(
+        f"candidate:{uid}", {"date": today.isoformat(), "id": str(found_tweet.data.id)}
+    )
+
+
+def __scan_window(today: datetime) -> datetime:
+    """Get the earliest time the Prompt for a day could have been tweeted."""
+    # A Prompt can be tweeted the day before in UTC because of time zones,
+    # so nothing older than yesterday can be today's Prompt
+    return datetime.combine(today.date() - timedelta(days=1), time.min, tzinfo=utc)
+
+
+def scan_timeline(
+    timeline: Iterable[tweepy.Response], today: datetime
+) -> tuple[tweepy.Response | None, str | None]:
+    """Look through a Host's tweets, newest first, for the day's Prompt tweet.
+
+    Gives back the Prompt tweet, if it was found, and the newest tweet ID seen.
+    The tweets can come from anywhere, such as a replayed timeline.
+    """
+    window_start = __scan_window(today)
+    newest_id = None
+    for response in timeline:
+        # Tweets come newest first, so keep track of the first one we see
+        if newest_id is None:
+            newest_id = str(response.data.id)
+
+        # We've gone past the current day and can stop looking
+        if response.data.created_at < window_start:
             break
 
+        # Found the prompt!
+        if tweet.is_likely_prompt_tweet(response.data):
+            return response, newest_id
+    return None, newest_id
+
+
+def find_prompt(uid: str, today: datetime) -> PromptCandidate | None:
+    # A rerun after the Prompt couldn't be recorded doesn't need to search again
+    if (found_tweet := __load_candidate(uid, today.date())) is not None:
+        return PromptCandidate.from_tweet(found_tweet)
+
+    # Only ask for tweets we haven't already looked at, if we can
+    period = __hosting_period(today.date())
+    scan_params: dict[str, Any]
+    if since_id := __load_cursor(uid, period):
+        scan_params = {"since_id": since_id}
+    else:
+        scan_params = {"start_time": __scan_window(today)}
+
+    # Get the tweets from the Host for the prompt, asking for everything
+    # we need about the Prompt up front so it doesn't need to be fetched again
+    found_tweet, newest_id = scan_timeline(
+        tweet.flatten(
+            Paginator(
+                tweet.twitter_v2_api().get_users_tweets,
+                id=uid,
+                max_results=50,
+                exclude=["replies", "retweets"],
+                **tweet.fetch_fields(),
+                **scan_params,
+            )
+        ),
+        today,
+    )
+
     # ...We never found the prompt. Sad face day :(
+    # Remember where we stopped so the next run only looks at new tweets
     if found_tweet is None:
+        if newest_id is not None:
+            __save_cursor(uid, period, newest_id)
         return None
 
-    # ...OOOOORRRRRRRR we did, so return a proper Response object.
-    # People these days. You just never know if they'll say what you want! /s
-    return TWITTER_API.get_tweet(found_tweet.id, **tweet.fetch_fields())
+    # ...OOOOORRRRRRRR we did. People these days.
+    # You just never know if they'll say what you want! /s
+    # Only a tweet with a Prompt word is worth coming back to. Anything else,
+    # like a reminder, would otherwise be found again on every run today
+    candidate = PromptCandidate.from_tweet(found_tweet)
+    if candidate.word is not None:
+        __save_candidate(uid, today.date(), found_tweet)
+    return candidate
 
 
+@metrics.run("fetch")
 def main() -> bool:
     # Start by getting today's date because it's surprising
     # how often we actually need this info
@@ -52,19 +157,24 @@ def main() -> bool:
         print("Today is on or after January 1, 2024. Refusing to run.")
         return True
 
+    # Pick up any changes to the Prompt configuration since the last run
+    config.refresh()
+
     # Get the latest recorded prompt to see if we need to do anything
-    latest_tweet = v2.get("prompts/")[0]
-    latest_tweet["date"] = date.fromisoformat(latest_tweet["date"])
+    with metrics.span("fetch.latest_prompt"):
+        latest_prompt = Prompt.from_api(v2.get("prompts/")[0])
 
     # We already have latest tweet, don't do anything
-    if latest_tweet["date"] == today.date():
+    if latest_prompt.date == today.date():
         print(f"Prompt for {today} already found. Aborting...")
+        state.save("found_on", today.date().isoformat())
         return False
 
     # Hosts serve for 15 days (2 Hosts/mo). Ask the API who is currently hosting
     print("Identifying the current Host")
     try:
-        current_host = v2.get("hosts", "current")
+        with metrics.span("fetch.current_host"):
+            current_host = Host.from_api(v2.get("hosts", "current"))
 
     # If that fails, we don't have an assigned Host for this period and must stop
     except HTTPError:
@@ -72,98 +182,104 @@ def main() -> bool:
         return False
 
     # Attempt to find the prompt
-    print(f"The current Host is {current_host['handle']}.")
+    print(f"The current Host is {current_host.handle}.")
     print("Searching for the latest Prompt...")
-    prompt_tweet = find_prompt(current_host["twitter_uid"])
+    try:
+        with metrics.span("fetch.find_prompt"):
+            candidate = find_prompt(current_host.twitter_uid, today)
+
+    # Try again on the next run instead of waiting around for the limit to reset
+    except ratelimit.RateLimited as exc:
+        print(f"{exc}. Aborting...")
+        return False
 
     # The tweet was not found at all :(
-    if prompt_tweet is None:
+    if candidate is None:
         print("Search limit reached without finding Prompt! Aborting...")
         return False
+    return record_candidate(candidate, current_host, today, latest_prompt)
 
-    # The found tweet date is yesterday's date, indicating a
-    # time zone difference. Tweet datetimes are always expressed
-    # in UTC, so attempt to get to tomorrow's date
-    # and see if it matches the expected tweet date
-    tweet_date: datetime = prompt_tweet.data.created_at
-    if tweet_date.day - today.day < 0:
-        next_day_hour_difference = 24 - prompt_tweet.data.created_at.hour
-        tweet_date: datetime = prompt_tweet.data.created_at + timedelta(
-            hours=next_day_hour_difference
-        )
 
-    # Discard the time data. We don't need it
-    tweet_date: date = tweet_date.date()
+def date_to_record(
+    candidate: PromptCandidate, today: date, latest: date
+) -> date | None:
+    """Get the day a Prompt tweet is recorded for.
+
+    Gives back nothing if it isn't recorded, because it has no Prompt word
+    or the Prompt for that day has already been recorded.
+    """
+    tweet_date = candidate.date_for(today)
+    if tweet_date == latest or candidate.word is None:
+        return None
+    return tweet_date
+
+
+def record_candidate(
+    candidate: PromptCandidate,
+    current_host: Host,
+    today: datetime,
+    latest_prompt: Prompt,
+) -> bool:
+    """Record a Prompt tweet from the current Host, unless it already has been."""
+    # Work out which day the Prompt is for
+    tweet_date = date_to_record(candidate, today.date(), latest_prompt.date)
+
+    # The latest Prompt may have come from the cache, which doesn't know about
+    # a Prompt recorded somewhere else, such as on the site. Ask the API itself
+    # before recording this one
+    if tweet_date is not None:
+        cache.invalidate("prompts/")
+        with metrics.span("fetch.check_latest"):
+            latest_prompt = Prompt.from_api(v2.get("prompts/")[0])
+        tweet_date = date_to_record(candidate, today.date(), latest_prompt.date)
+
+    # Attempt to extract the prompt word and back out if we can't
+    if candidate.word is None:
+        __save_candidate(current_host.twitter_uid, today.date(), None)
+        print(f"Cannot find Prompt word in tweet {candidate.id}")
+        return False
 
     # We already have the latest tweet, don't do anything
     # This condition is hit when it is _technically_ the next day
     # but the newest tweet hasn't been sent out
-    if tweet_date == latest_tweet["date"]:
+    if tweet_date is None:
+        # Keep looking for the new Prompt on the next run, but only after
+        # this one, which may have been recorded by hand or a backfill
+        __save_candidate(current_host.twitter_uid, today.date(), None)
+        __save_cursor(
+            current_host.twitter_uid, __hosting_period(today.date()), candidate.id
+        )
         print(
-            f"The latest Prompt for {tweet_date.isoformat()} has already found."
-            " Aborting..."
+            f"The latest Prompt for {latest_prompt.date.isoformat()} has already"
+            " found. Aborting..."
         )
         return False
 
-    # Attempt to extract the prompt word and back out if we can't
-    prompt_word = tweet.get_prompt(prompt_tweet)
-    if prompt_word is None:
-        print(f"Cannot find Prompt word in tweet {prompt_tweet.data.id}")
+    # Record the Prompt and send it out
+    with metrics.span("fetch.record") as labels:
+        labels["success"] = v2_async.run(record.record(candidate.to_prompt(tweet_date)))
+    if not labels["success"]:
         return False
 
-    # Construct an API request object
-    prompt = {
-        "content": tweet.get_text(prompt_tweet),
-        "date": tweet_date.isoformat(),
-        "host_handle": prompt_tweet[1]["users"][0].username,
-        "twitter_id": str(prompt_tweet.data.id),
-        "word": prompt_word,
-    }
-
-    # Pull out any possible media
-    media_alt_text = tweet.get_media_alt_text(prompt_tweet)
-    media_url = tweet.get_media(prompt_tweet)
-    prompt_media = {}
-    if media_url is not None:
-        prompt_media = {"items": [{"alt_text": media_alt_text, "url": media_url}]}
+    # Remember the Prompt has been found so polling can stop for the day
+    state.save("found_on", tweet_date.isoformat())
 
-    try:
-        # Add the tweet to the database
-        print("Adding Prompt to database...")
-        r = v2.post("prompts/", json=prompt)
-
-        # Create any media that is attached to the tweet
-        if prompt_media:
-            print("Recording Prompt Media...")
-            prompt_id = r["_id"]
-            v2.post("prompts", str(prompt_id), "media/", json=prompt_media)
-
-        # Generate a new Prompt archive
-        print("Creating new Prompt archive...")
-        v2.post("archive/")
-
-        # Send the email broadcast.
-        # For some reason, this exception keeps getting raised
-        # despite the emails actually sending out, so suppress it
-        with suppress(RemoteProtocolError):
-            print("Sending out notification emails...")
-            v2.post("notifications", tweet_date.isoformat())
-
-    except HTTPError as exc:
-        print(f"Cannot add Prompt for {tweet_date.isoformat()} to the database!")
-        print(f"{exc.__class__.__name__}: {exc}")
-        return False
+    # Later scans only need to look at tweets after the Prompt
+    __save_cursor(
+        current_host.twitter_uid, __hosting_period(today.date()), candidate.id
+    )
+
+    # The media, archive, and notifications were queued for the job worker,
+    # so a slow email broadcast doesn't hold up finding the Prompt
     return True
 
 
-def schedule() -> None:
-    """Schedule the Prompt fetch process."""
-    scheduler = BlockingScheduler()
-
+def register(scheduler: Any) -> None:
+    """Add the Prompt fetch jobs to a scheduler."""
     # Get the scheduled times
     schedule_times: list[str] = sys_vars.get_json("SCHEDULE_TIMES")
-    for time in schedule_times:
-        minute, hour = time.split()
+    for schedule_time in schedule_times:
+        minute, hour = schedule_time.split()
 
         # Create a job for each time
         scheduler.add_job(
@@ -176,5 +292,16 @@ def schedule() -> None:
             timezone=utc,
         )
 
+    # Retry any follow-up tasks that didn't finish when a Prompt was recorded
+    jobs.register(scheduler)
+
+
+def schedule() -> None:
+    """Schedule the Prompt fetch process."""
+    from apscheduler.schedulers.blocking import BlockingScheduler
+
+    scheduler = BlockingScheduler()
+    register(scheduler)
+
     # Start the scheduler
     scheduler.start()
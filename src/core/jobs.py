@@ -0,0 +1,253 @@
+import asyncio
+import logging
+import sqlite3
+from argparse import Namespace
+from contextlib import closing, suppress
+from json import dumps, loads
+from time import time
+from typing import Any, Awaitable, Callable
+
+import sys_vars
+from httpx import HTTPError, RemoteProtocolError
+
+from src.core.api import _client, v2_async
+from src.helpers import database, metrics
+
+__all__ = ["drain", "enqueue", "main", "register"]
+
+
+log = logging.getLogger("vss365today-finder")
+
+
+def __connect() -> sqlite3.Connection:
+    """Connect to the job queue database."""
+    conn = database.connect("jobs")
+    conn.row_factory = sqlite3.Row
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS jobs ("
+        "id INTEGER PRIMARY KEY, "
+        "kind TEXT NOT NULL, "
+        "payload TEXT NOT NULL, "
+        "key TEXT NOT NULL UNIQUE, "
+        "depends_on INTEGER REFERENCES jobs (id), "
+        "status TEXT NOT NULL DEFAULT 'pending', "
+        "attempts INTEGER NOT NULL DEFAULT 0, "
+        "run_after REAL NOT NULL, "
+        "updated REAL NOT NULL, "
+        "last_error TEXT)"
+    )
+    return conn
+
+
+async def __record_media(key: str, payload: dict) -> None:
+    """Record the media attached to a Prompt."""
+    print(f"Recording Prompt Media for Prompt {payload['prompt_id']}...")
+    await v2_async.post(
+        "prompts",
+        str(payload["prompt_id"]),
+        "media/",
+        json=payload["media"],
+        headers={"Idempotency-Key": key},
+    )
+
+
+async def __generate_archive(key: str, payload: dict) -> None:
+    """Generate a new Prompt archive."""
+    print("Creating new Prompt archive...")
+    await v2_async.post("archive/", headers={"Idempotency-Key": key})
+
+
+async def __send_notifications(key: str, payload: dict) -> None:
+    """Send out the notification emails for a Prompt date."""
+    print(f"Sending out notification emails for {payload['date']}...")
+
+    # For some reason, this exception keeps getting raised
+    # despite the emails actually sending out, so suppress it.
+    # The broadcast takes as long as it takes, so wait for all of it
+    with suppress(RemoteProtocolError):
+        await v2_async.post(
+            "notifications",
+            payload["date"],
+            headers={"Idempotency-Key": key},
+            timeout=_client.timeout(read=None),
+        )
+
+
+async def __mirror_media(key: str, payload: dict) -> None:
+    """Mirror a Prompt's media into the images directory."""
+    from src.core import media
+
+    print(f"Mirroring media for Prompt {payload['prompt_id']}...")
+    mirrored = await media.mirror(payload["urls"])
+    if failed := [url for url, path in mirrored.items() if path is None]:
+        raise OSError(f"Unable to mirror {', '.join(failed)}")
+
+
+HANDLERS: dict[str, Callable[[str, dict], Awaitable[None]]] = {
+    "archive": __generate_archive,
+    "media": __record_media,
+    "mirror": __mirror_media,
+    "notifications": __send_notifications,
+}
+
+# How many times a kind of job is tried if it differs from `JOBS_MAX_ATTEMPTS`.
+# An email broadcast can go out even when its request fails, so it is never
+# tried again. A failed broadcast can be resent with the `email` command
+MAX_ATTEMPTS: dict[str, int] = {"notifications": 1}
+
+
+def enqueue(kind: str, payload: dict, key: str, depends_on: int | None = None) -> int:
+    """Queue a job to be run by the worker.
+
+    The key makes the job idempotent. Queueing a job with a key that has
+    already been queued does nothing and gives back the existing job.
+    """
+    now = time()
+    with closing(__connect()) as conn, conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO jobs "
+            "(kind, payload, key, depends_on, run_after, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (kind, dumps(payload), key, depends_on, now, now),
+        )
+        return conn.execute("SELECT id FROM jobs WHERE key = ?", (key,)).fetchone()[0]
+
+
+def __claim(limit: int) -> list[sqlite3.Row]:
+    """Claim the jobs that are ready to run."""
+    now = time()
+    stale_after = sys_vars.get_int("JOBS_STALE_SECONDS", default=3600)
+    with closing(__connect()) as conn, conn:
+        conn.execute("BEGIN IMMEDIATE")
+
+        # A job left running by a worker that died can be picked back up,
+        # unless it may have already been done and can only be tried once
+        once = [kind for kind, attempts in MAX_ATTEMPTS.items() if attempts <= 1]
+        conn.execute(
+            "UPDATE jobs SET status = CASE WHEN kind IN"
+            f" ({', '.join('?' * len(once))}) THEN 'failed' ELSE 'pending' END,"
+            " last_error = COALESCE(last_error, 'worker stopped') WHERE status ="
+            " 'running' AND updated < ?",
+            (*once, now - stale_after),
+        )
+
+        # Jobs can't run if what they depend on failed
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', last_error = 'dependency failed', "
+            "updated = ? WHERE status = 'pending' AND depends_on IN "
+            "(SELECT id FROM jobs WHERE status = 'failed')",
+            (now,),
+        )
+
+        jobs = conn.execute(
+            "SELECT * FROM jobs WHERE status = 'pending' AND run_after <= ? "
+            "AND (depends_on IS NULL OR depends_on IN "
+            "(SELECT id FROM jobs WHERE status = 'done')) "
+            "ORDER BY id LIMIT ?",
+            (now, limit),
+        ).fetchall()
+        conn.executemany(
+            "UPDATE jobs SET status = 'running', updated = ? WHERE id = ?",
+            [(now, job["id"]) for job in jobs],
+        )
+    return jobs
+
+
+def __finish(job: sqlite3.Row, error: Exception | None) -> bool:
+    """Record the outcome of a job, scheduling a retry if it failed."""
+    now = time()
+    attempts = job["attempts"] + 1
+    max_attempts = MAX_ATTEMPTS.get(job["kind"]) or sys_vars.get_int(
+        "JOBS_MAX_ATTEMPTS", default=5
+    )
+    with closing(__connect()) as conn, conn:
+        if error is None:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', attempts = ?, updated = ? "
+                "WHERE id = ?",
+                (attempts, now, job["id"]),
+            )
+            return True
+
+        # Back off exponentially between attempts
+        delay = min(30 * 2 ** (attempts - 1), 3600)
+        status = "failed" if attempts >= max_attempts else "pending"
+        conn.execute(
+            "UPDATE jobs SET status = ?, attempts = ?, run_after = ?, updated = ?, "
+            "last_error = ? WHERE id = ?",
+            (status, attempts, now + delay, now, str(error), job["id"]),
+        )
+    print(f"Job {job['key']} failed (attempt {attempts}/{max_attempts}): {error}")
+    return False
+
+
+async def __run(job: sqlite3.Row) -> bool:
+    """Run a single job."""
+    try:
+        with metrics.span(f"job.{job['kind']}"):
+            await HANDLERS[job["kind"]](job["key"], loads(job["payload"]))
+    except (HTTPError, OSError) as exc:
+        return __finish(job, exc)
+
+    # One broken job shouldn't stop the rest from running
+    except Exception as exc:
+        log.exception(f"Job {job['key']} raised an unexpected error")
+        return __finish(job, exc)
+    return __finish(job, None)
+
+
+async def __drain() -> int:
+    """Run the ready jobs a few at a time until none are left."""
+    finished = 0
+    limit = sys_vars.get_int("JOBS_CONCURRENCY", default=4)
+
+    # Finishing a job can make the jobs that depend on it ready,
+    # so keep going until there is nothing left that can run
+    while jobs := __claim(limit):
+        results = await asyncio.gather(*[__run(job) for job in jobs])
+        finished += sum(results)
+    return finished
+
+
+def drain() -> int:
+    """Run every queued job that is ready, returning how many succeeded."""
+    return v2_async.run(__drain())
+
+
+def __status() -> dict[str, Any]:
+    """Count the jobs in each state and get the most recent failures."""
+    with closing(__connect()) as conn:
+        counts = dict(
+            conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        )
+        failed = conn.execute(
+            "SELECT key, attempts, last_error FROM jobs WHERE status = 'failed' "
+            "ORDER BY id DESC LIMIT 10"
+        ).fetchall()
+    return {"counts": counts, "failed": failed}
+
+
+@metrics.run("jobs")
+def main(args: Namespace) -> bool:
+    """Run the queued jobs, or show the state of the queue."""
+    if args.status:
+        status = __status()
+        for name in ("pending", "running", "done", "failed"):
+            print(f"{name}: {status['counts'].get(name, 0)}")
+        for job in status["failed"]:
+            print(f"  {job['key']} ({job['attempts']} attempts): {job['last_error']}")
+        return True
+
+    print(f"{drain()} job(s) completed")
+    return True
+
+
+def register(scheduler: Any) -> None:
+    """Add a worker that drains the job queue to a scheduler."""
+    scheduler.add_job(
+        drain,
+        trigger="interval",
+        seconds=sys_vars.get_int("JOBS_INTERVAL", default=15),
+        max_instances=1,
+        coalesce=True,
+    )
@@ -1,21 +1,92 @@
-from contextlib import suppress
+import csv
+import json
+from dataclasses import dataclass
 from datetime import date
+from pathlib import Path
+from typing import Any
+from uuid import uuid4
 
-from httpx import HTTPError, RemoteProtocolError
+import sys_vars
 
-from src.core.api import v2
-from src.helpers import tweet
+from src.core import jobs, record
+from src.core.api import v2_async
+from src.helpers import metrics, ratelimit, tweet, tweet_cache
+from src.helpers.candidate import PromptCandidate
 
 __all__ = ["main"]
 
 
-def main() -> bool:
-    """Manually specify and record a Prompt."""
-    # Cutoff date
-    if date.today() >= date(2024, 1, 1):
-        print("Today is on or after January 1, 2024. Refusing to run.")
-        return True
+@dataclass(frozen=True, slots=True)
+class Row:
+    """A Prompt to record by hand and what to do after it is recorded."""
+
+    date: date
+    url: str
+    is_additional: bool = False
+    notify: bool = False
+    archive: bool = False
+
+
+def __is_yes(value: Any) -> bool:
+    """Read a yes or no answer, which is no unless it says otherwise."""
+    if isinstance(value, bool):
+        return value
+    return str(value or "").strip().lower() in ("y", "yes", "true", "1")
+
+
+def __parse_row(fields: dict) -> Row:
+    """Create a Row from the fields of a file line."""
+    url = str(fields.get("url") or "").strip()
+    if not tweet.is_url(url):
+        raise ValueError(f"{url!r} is not a tweet URL")
+    return Row(
+        date=date.fromisoformat(str(fields.get("date") or "").strip()),
+        url=url,
+        is_additional=__is_yes(fields.get("additional")),
+        notify=__is_yes(fields.get("notify")),
+        archive=__is_yes(fields.get("archive")),
+    )
+
+
+def __read_file(path: Path) -> list[Row] | None:
+    """Read the Prompts to record from a CSV or JSON lines file.
+
+    Every line has a date, url, and optionally the additional, notify,
+    and archive flags. Nothing is recorded if any line is wrong.
+    """
+    lines: list[tuple[int, Any]] = []
+    errors: list[tuple[int, str]] = []
+    with path.open(newline="") as f:
+        if path.suffix.lower() in (".jsonl", ".ndjson"):
+            for num, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    lines.append((num, json.loads(line)))
+                except json.JSONDecodeError as exc:
+                    errors.append((num, str(exc)))
+        else:
+            reader = csv.DictReader(f)
+            lines = [(reader.line_num, fields) for fields in reader]
+
+    rows = []
+    for num, fields in lines:
+        try:
+            if not isinstance(fields, dict):
+                raise ValueError("expected an object")
+            rows.append(__parse_row(fields))
+        except ValueError as exc:
+            errors.append((num, str(exc)))
+
+    if errors:
+        print(f"Unable to read {path}, nothing was recorded:")
+        print("\n".join(f"line {num}: {error}" for num, error in sorted(errors)))
+        return None
+    return rows
 
+
+def __ask() -> Row | None:
+    """Ask for the Prompt to record."""
     # Get the information we need
     tweet_date = date.fromisoformat(
         input("Enter the Prompt date (YYYY-MM-DD): ").strip()
@@ -30,63 +101,79 @@ def main() -> bool:
     should_generate_archive = input(
         "Should an archive spreadsheet be generated with this Prompt? (y/N) "
     ).strip()
-    tweet_is_additional = tweet_duplicate_date.lower() == "y"
 
     # It's not a Twitter URL
     if not tweet.is_url(tweet_url):
-        return False
-
-    # Connect to the Twitter API to get the prompt tweet
-    twitter_api = tweet.twitter_v2_api()
-    print("Successfully connected to the Twitter API")
-    prompt_tweet = twitter_api.get_tweet(
-        tweet.get_id(tweet_url), **tweet.fetch_fields()
+        return None
+    return Row(
+        date=tweet_date,
+        url=tweet_url.strip(),
+        is_additional=tweet_duplicate_date.lower() == "y",
+        notify=should_send_emails.lower() == "y",
+        archive=should_generate_archive.lower() == "y",
     )
 
-    # Construct an API request object
-    prompt = {
-        "content": tweet.get_text(prompt_tweet),
-        "date": tweet_date.isoformat(),
-        "host_handle": prompt_tweet[1]["users"][0].username,
-        "twitter_id": str(prompt_tweet.data.id),
-        "word": tweet.get_prompt(prompt_tweet),
-        "is_additional": tweet_is_additional,
-    }
-
-    # Pull out any possible media
-    media_alt_text = tweet.get_media_alt_text(prompt_tweet)
-    media_url = tweet.get_media(prompt_tweet)
-    prompt_media = {}
-    if media_url is not None:
-        prompt_media = {"items": [{"alt_text": media_alt_text, "url": media_url}]}
 
+def __record_rows(rows: list[Row]) -> bool:
+    """Record the Prompt tweets in each row."""
+    # Get every tweet at once, reusing any tried before
+    tweet_ids = [tweet.get_id(row.url) for row in rows]
     try:
-        # Add the tweet to the database
-        print("Adding Prompt to database...")
-        r = v2.post("prompts/", json=prompt)
-
-        # Create any media that is attached to the tweet
-        if prompt_media:
-            print("Recording Prompt Media...")
-            prompt_id = r["_id"]
-            v2.post("prompts", str(prompt_id), "media/", json=prompt_media)
-
-        # Generate an archive file if desired
-        if should_generate_archive.lower() == "y":
-            # Handle if this is a newly recorded tweet
-            print("Generating new archive spreadsheet...")
-            v2.post("archive/")
-
-        # Send the email broadcast if desired
-        if should_send_emails.lower() == "y":
-            print("Sending out notification emails...")
-            # For some reason, this exception keeps getting raised
-            # despite the emails actually sending out, so suppress it
-            with suppress(RemoteProtocolError):
-                v2.post("notifications", tweet_date.isoformat())
-
-    except HTTPError as exc:
-        print(f"Cannot add Prompt for {tweet_date} to the database!")
-        print(f"{exc.__class__.__name__}: {exc}")
+        tweets = tweet_cache.get_tweets(tweet_ids)
+    except ratelimit.RateLimited as exc:
+        print(exc)
+        return False
+
+    # Construct the Prompts from the tweets
+    prompts = {}
+    for i, (row, tweet_id) in enumerate(zip(rows, tweet_ids)):
+        if (prompt_tweet := tweets[tweet_id]) is None:
+            print(f"Cannot find tweet {tweet_id}")
+            continue
+        prompts[i] = (
+            PromptCandidate.from_tweet(prompt_tweet).to_prompt(
+                row.date, is_additional=row.is_additional
+            ),
+            row.notify,
+        )
+
+    # Record the Prompts, then run the follow-up tasks now instead of
+    # waiting for the worker, generating the archive after all their media
+    workers = sys_vars.get_int("MANUAL_WORKERS", default=4)
+    recorded = v2_async.run(record.record_all(prompts, workers)) if prompts else {}
+    if any(recorded.values()):
+        jobs.drain()
+        if any(rows[i].archive for i, is_recorded in recorded.items() if is_recorded):
+            jobs.enqueue("archive", {}, key=f"archive:manual:{uuid4().hex}")
+            jobs.drain()
+
+    # Report how each row went
+    if len(rows) > 1:
+        print("\nManual results:")
+        for i, row in enumerate(rows):
+            if i not in prompts:
+                result = "tweet not found"
+            elif recorded[i]:
+                result = f"recorded {prompts[i][0].word}"
+            else:
+                result = "failed to record"
+            print(f"{row.date.isoformat()} {row.url}: {result}")
+
+    return len(recorded) == len(rows) and all(recorded.values())
+
+
+@metrics.run("manual")
+def main(from_file: Path | None = None) -> bool:
+    """Manually specify and record a Prompt, or every Prompt in a file."""
+    # Cutoff date
+    if date.today() >= date(2024, 1, 1):
+        print("Today is on or after January 1, 2024. Refusing to run.")
+        return True
+
+    if from_file is None:
+        rows = [row] if (row := __ask()) is not None else None
+    else:
+        rows = __read_file(from_file)
+    if not rows:
         return False
-    return True
+    return __record_rows(rows)
@@ -0,0 +1,196 @@
+import asyncio
+import logging
+from argparse import Namespace
+from contextlib import suppress
+from datetime import date
+from hashlib import sha1
+from importlib.util import find_spec
+from os import link, replace
+from pathlib import Path
+
+import httpx
+import sys_vars
+from httpx import HTTPError
+
+from src.core.api import _client, v2_async
+from src.helpers import files, metrics, periods, state, tweet, tweet_cache
+from src.helpers.models import Prompt
+
+__all__ = ["main", "mirror"]
+
+
+log = logging.getLogger("vss365today-finder")
+
+# Formats that can be resized without losing anything, such as animation
+RESIZABLE = frozenset((".jpeg", ".jpg", ".png", ".webp"))
+
+
+def __resize(path: Path, widths: list[int]) -> list[Path]:
+    """Write smaller copies of an image at each of the given widths.
+
+    Resizing requires the optional `Pillow` package.
+    """
+    if not widths or path.suffix.lower() not in RESIZABLE:
+        return []
+    if find_spec("PIL") is None:
+        log.warning("MEDIA_WIDTHS is set but `Pillow` is not installed. Not resizing")
+        return []
+
+    from PIL import Image
+
+    variants = []
+    with Image.open(path) as image:
+        for width in widths:
+            # Never make an image bigger than it already is
+            if image.width <= width:
+                continue
+
+            variant = path.with_name(f"{path.stem}_{width}{path.suffix}")
+            if not variant.exists():
+                resized = image.copy()
+                resized.thumbnail((width, image.height))
+                resized.save(variant)
+            variants.append(variant)
+    return variants
+
+
+async def __download(client: httpx.AsyncClient, url: str, part_dir: Path) -> Path:
+    """Download a file, picking up where an earlier download stopped if possible."""
+    part_file = part_dir / f"{sha1(url.encode()).hexdigest()}.part"
+    offset = part_file.stat().st_size if part_file.exists() else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+    with metrics.span("media.download", route=httpx.URL(url).host) as labels:
+        async with client.stream("GET", url, headers=headers) as r:
+            labels["status"] = r.status_code
+
+            # The earlier download already has the whole file
+            if r.status_code == 416:
+                return part_file
+            r.raise_for_status()
+
+            # Only add to the earlier download if the server sent the rest of it
+            with part_file.open("ab" if r.status_code == 206 else "wb") as f:
+                async for chunk in r.aiter_bytes():
+                    f.write(chunk)
+            labels["bytes"] = r.num_bytes_downloaded
+    return part_file
+
+
+def __local_name(url: str) -> str:
+    """Get the name a media file is mirrored as, which the site can also work out."""
+    path = Path(httpx.URL(url).path)
+    if not path.stem:
+        return f"{sha1(url.encode()).hexdigest()}.jpg"
+    return path.name if path.suffix else f"{path.name}.jpg"
+
+
+def __store(part_file: Path, mirrored: Path, original: Path | None) -> None:
+    """Move a download into place, sharing the file of an identical image."""
+    if original is not None and original != mirrored and original.exists():
+        mirrored.unlink(missing_ok=True)
+
+        # Keep the download itself if the file can't be linked to
+        with suppress(OSError):
+            link(original, mirrored)
+            part_file.unlink()
+            return
+    replace(part_file, mirrored)
+
+
+async def __mirror_one(
+    client: httpx.AsyncClient, url: str, semaphore: asyncio.Semaphore
+) -> Path:
+    """Mirror a single media file into the images directory."""
+    images_dir = sys_vars.get_path("IMAGES_DIR")
+    part_dir = sys_vars.get_path("DATA_DIR", default=Path("data")) / "media"
+    part_dir.mkdir(parents=True, exist_ok=True)
+
+    # This file has already been mirrored
+    mirrored = images_dir / __local_name(url)
+    if mirrored.exists():
+        return mirrored
+
+    async with semaphore:
+        part_file = await __download(client, url, part_dir)
+
+    # The same image can be attached to more than one tweet, so only store it once
+    digest = await asyncio.to_thread(files.hash_file, part_file)
+    original = state.load(f"media:{digest}")
+    __store(part_file, mirrored, images_dir / original if original else None)
+    state.save(f"media:{digest}", mirrored.name)
+
+    widths = sys_vars.get_json("MEDIA_WIDTHS", default=[])
+    await asyncio.to_thread(__resize, mirrored, widths)
+    return mirrored
+
+
+async def mirror(urls: list[str]) -> dict[str, Path | None]:
+    """Mirror media into the images directory, a few files at a time.
+
+    Gives back where each file was mirrored to, or nothing if it couldn't be.
+    """
+    semaphore = asyncio.Semaphore(sys_vars.get_int("MEDIA_WORKERS", default=4))
+    async with httpx.AsyncClient(**_client.options(), follow_redirects=True) as client:
+        results = await asyncio.gather(
+            *[__mirror_one(client, url, semaphore) for url in urls],
+            return_exceptions=True,
+        )
+
+    mirrored: dict[str, Path | None] = {}
+    for url, result in zip(urls, results):
+        # Only download and disk errors are expected, anything else is a bug
+        if isinstance(result, (HTTPError, OSError)):
+            print(f"Unable to mirror {url}: {result}")
+            mirrored[url] = None
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            mirrored[url] = result
+    return mirrored
+
+
+async def __get_media_urls(prompt_date: date) -> list[str]:
+    """Get the media URLs of every Prompt recorded for a date."""
+    prompts = await v2_async.get_if_found("prompts", "date", prompt_date.isoformat())
+    if prompts is None:
+        return []
+
+    urls: list[str] = []
+    for data in prompts if isinstance(prompts, list) else [prompts]:
+        prompt = Prompt.from_api(data)
+        if prompt.media:
+            urls.extend(item.url for item in prompt.media)
+
+        # Older Prompts may not include their media, so ask Twitter instead
+        elif prompt.twitter_id:
+            prompt_tweet = await asyncio.to_thread(
+                tweet_cache.get_tweet, prompt.twitter_id
+            )
+            if prompt_tweet.data is not None and (url := tweet.get_media(prompt_tweet)):
+                urls.append(url)
+    return urls
+
+
+async def __backfill(start: date, end: date) -> dict[str, Path | None]:
+    """Mirror the media of every Prompt recorded between two dates."""
+    dates = periods.days(start, end)
+    results = await asyncio.gather(*[__get_media_urls(d) for d in dates])
+    return await mirror([url for urls in results for url in urls])
+
+
+@metrics.run("media")
+def main(args: Namespace) -> bool:
+    """Mirror the media of existing Prompts into the images directory."""
+    start, end = args.backfill
+    print(f"Mirroring Prompt media from {start} to {end}...")
+    try:
+        mirrored = v2_async.run(__backfill(start, end))
+    except HTTPError as exc:
+        print("Unable to get the Prompts to mirror media for!")
+        print(f"{exc.__class__.__name__}: {exc}")
+        return False
+
+    failed = sum(path is None for path in mirrored.values())
+    print(f"Mirrored {len(mirrored) - failed} file(s), {failed} failed")
+    return not failed
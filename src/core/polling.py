@@ -0,0 +1,217 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from math import atan2, cos, pi, sin
+from statistics import fmean, quantiles
+from typing import Any, Iterator
+
+import sys_vars
+from httpx import HTTPError
+from pytz import utc
+
+from src.core import fetch, jobs
+from src.core.api import v2, v2_async
+from src.helpers import state, tweet
+from src.helpers.models import Host, Prompt
+
+__all__ = ["Poller", "Window", "learn_window", "register", "schedule"]
+
+
+MINUTES_PER_DAY = 24 * 60
+
+# Fewer Prompts than this isn't enough to guess when the next one will be sent
+MIN_SAMPLES = 3
+
+
+@dataclass(frozen=True, slots=True)
+class Window:
+    """The time of day a Prompt is usually found, in minutes after midnight UTC.
+
+    The start can be negative and the end can be past midnight
+    when the window wraps around the start of the day.
+    """
+
+    start: int
+    end: int
+
+    def occurrences(self, around: datetime) -> Iterator[tuple[datetime, datetime]]:
+        """Get the window on each day near a moment, earliest first."""
+        midnight = datetime.combine(around.date(), time.min, tzinfo=utc)
+        for days in range(-1, 3):
+            day = midnight + timedelta(days=days)
+            yield day + timedelta(minutes=self.start), day + timedelta(minutes=self.end)
+
+
+def learn_window(prompts: list[Prompt], margin: int) -> Window | None:
+    """Work out when Prompts are usually found from past Prompts.
+
+    Returns nothing if there are too few Prompts or they are too spread out.
+    """
+    minutes = []
+    for prompt in prompts:
+        sent = tweet.get_sent_time(prompt.twitter_id)
+
+        # A Prompt tweeted the day before in UTC can't be recorded
+        # until its day starts, so that is when it would be found
+        day_start = datetime.combine(prompt.date, time.min, tzinfo=utc)
+        found = max(sent, day_start)
+        minutes.append(found.hour * 60 + found.minute)
+
+    if len(minutes) < MIN_SAMPLES:
+        return None
+
+    # Times of day wrap around at midnight, so average them as angles
+    angles = [m / MINUTES_PER_DAY * 2 * pi for m in minutes]
+    center = atan2(fmean(map(sin, angles)), fmean(map(cos, angles)))
+    center = center / (2 * pi) * MINUTES_PER_DAY % MINUTES_PER_DAY
+
+    # Ignore the odd Prompt sent far from the rest. Those are still
+    # found by the slower polling outside of the window
+    offsets = [
+        (m - center + MINUTES_PER_DAY / 2) % MINUTES_PER_DAY - MINUTES_PER_DAY / 2
+        for m in minutes
+    ]
+    cuts = quantiles(offsets, n=10, method="inclusive")
+    window = Window(round(center + cuts[0] - margin), round(center + cuts[-1] + margin))
+
+    # A window covering the whole day is no better than not having one
+    if window.end - window.start >= MINUTES_PER_DAY:
+        return None
+    return window
+
+
+async def __get_history(today: date, days: int) -> list[Prompt]:
+    """Get the Prompts recorded for the days before today."""
+
+    async def get_day(prompt_date: date) -> list[Prompt]:
+        r = await v2_async.get_if_found("prompts", "date", prompt_date.isoformat())
+        if r is None:
+            return []
+        return [
+            Prompt.from_api(prompt) for prompt in (r if isinstance(r, list) else [r])
+        ]
+
+    results = await asyncio.gather(
+        *[get_day(today - timedelta(days=i)) for i in range(1, days + 1)]
+    )
+    return [prompt for result in results for prompt in result]
+
+
+def __current_window(today: date, days: int, margin: int) -> Window | None:
+    """Learn the posting window of the current Host."""
+    try:
+        prompts = v2_async.run(__get_history(today, days))
+        handle = Host.from_api(v2.get("hosts", "current")).handle
+    except HTTPError as exc:
+        print(f"Unable to learn the Prompt posting window: {exc}")
+        return None
+
+    # Prefer the current Host's own habits, but every Host is
+    # better than nothing early on in a Hosting Period
+    own = [p for p in prompts if p.host_handle == handle]
+    return learn_window(own, margin) or learn_window(prompts, margin)
+
+
+@dataclass(slots=True)
+class Poller:
+    """Decide when to next look for a Prompt.
+
+    Polling is quick inside the window a Prompt is usually found in and backs
+    off exponentially outside of it. Once the Prompt is found, polling stops
+    until the next day's window.
+    """
+
+    min_interval: float
+    max_interval: float
+    interval: float = 0
+
+    def next_poll(
+        self, now: datetime, window: Window | None, found_on: date | None
+    ) -> datetime:
+        """Get when to next look for the Prompt."""
+        # Today's Prompt has been found, so wait for tomorrow's
+        if found_on is not None and found_on >= now.date():
+            self.interval = 0
+            tomorrow = datetime.combine(
+                found_on + timedelta(days=1), time.min, tzinfo=utc
+            )
+            if window is None:
+                return tomorrow
+            return next(
+                max(start, tomorrow)
+                for start, end in window.occurrences(tomorrow)
+                if end > tomorrow
+            )
+
+        # Check often while the Prompt is likely to be sent
+        if window is not None and any(
+            start <= now < end for start, end in window.occurrences(now)
+        ):
+            self.interval = self.min_interval
+            return now + timedelta(seconds=self.interval)
+
+        # Outside of the window, wait a bit longer each time
+        # but never past the start of the next window
+        self.interval = min(
+            max(self.interval * 2, self.min_interval), self.max_interval
+        )
+        next_time = now + timedelta(seconds=self.interval)
+        if window is not None:
+            next_start = next(s for s, _ in window.occurrences(now) if s > now)
+            next_time = min(next_time, next_start)
+        return next_time
+
+
+def register(scheduler: Any) -> None:
+    """Add a Prompt fetch job that reschedules itself to a scheduler."""
+    poller = Poller(
+        min_interval=sys_vars.get_int("POLL_MIN_SECONDS", default=120),
+        max_interval=sys_vars.get_int("POLL_MAX_SECONDS", default=3600),
+    )
+    history_days = sys_vars.get_int("POLL_HISTORY_DAYS", default=14)
+    margin = sys_vars.get_int("POLL_WINDOW_MARGIN", default=30)
+
+    # The window is only learned once a day
+    learned: dict[date, Window | None] = {}
+
+    def poll() -> None:
+        try:
+            fetch.main()
+
+        # Whatever happens, the next check has to be scheduled
+        except Exception:
+            logging.getLogger("vss365today-finder").exception("Prompt fetch failed")
+        finally:
+            now = datetime.now(tz=utc)
+            if now.date() not in learned:
+                learned.clear()
+                learned[now.date()] = __current_window(now.date(), history_days, margin)
+
+            found_on = state.load("found_on")
+            next_time = poller.next_poll(
+                now,
+                learned[now.date()],
+                date.fromisoformat(found_on) if found_on else None,
+            )
+            print(f"Next Prompt check at {next_time.isoformat()}")
+            scheduler.add_job(
+                poll,
+                trigger="date",
+                run_date=next_time,
+                id="poll",
+                replace_existing=True,
+            )
+
+    # Look right away, then let the poller decide
+    scheduler.add_job(poll, id="poll")
+    jobs.register(scheduler)
+
+
+def schedule() -> None:
+    """Schedule the Prompt fetch process around when the Prompt is usually sent."""
+    from apscheduler.schedulers.blocking import BlockingScheduler
+
+    scheduler = BlockingScheduler()
+    register(scheduler)
+    scheduler.start()
@@ -0,0 +1,91 @@
+import asyncio
+from typing import Hashable, Mapping, TypeVar
+
+from httpx import HTTPError
+
+from src.core import jobs
+from src.core.api import v2_async
+from src.helpers import metrics
+from src.helpers.models import Prompt
+
+__all__ = ["record", "record_all"]
+
+
+K = TypeVar("K", bound=Hashable)
+
+
+async def record(prompt: Prompt, *, archive: bool = True, notify: bool = True) -> bool:
+    """Record a Prompt, then queue its media and any follow-up tasks.
+
+    Only the Prompt itself is recorded right away. Its media, a local copy of
+    the media, the archive generation, and the notification broadcast are
+    handed to the job queue, so a failure in one of them is retried without
+    recording the Prompt again.
+    """
+    try:
+        # Add the tweet to the database
+        print("Adding Prompt to database...")
+        with metrics.span("record.prompt"):
+            # The key lets the Prompt be sent again if the connection drops
+            # without it being recorded twice
+            r = await v2_async.post(
+                "prompts/",
+                json=prompt.to_api(),
+                headers={
+                    "Idempotency-Key": f"prompt:{prompt.date}:{prompt.twitter_id}"
+                },
+            )
+
+    except HTTPError as exc:
+        print(f"Cannot add Prompt for {prompt.date} to the database!")
+        print(f"{exc.__class__.__name__}: {exc}")
+        return False
+
+    # Create any media that is attached to the tweet
+    prompt_id = r["_id"]
+    media_job = None
+    if prompt.media:
+        media_job = jobs.enqueue(
+            "media",
+            {"prompt_id": prompt_id, "media": prompt.media_to_api()},
+            key=f"media:{prompt_id}",
+        )
+
+        # Keep a local copy so the site doesn't rely on Twitter's servers
+        jobs.enqueue(
+            "mirror",
+            {
+                "prompt_id": prompt_id,
+                "urls": [item.url for item in prompt.media],
+            },
+            key=f"mirror:{prompt_id}",
+        )
+
+    # The follow-up tasks only wait on the media, not on each other
+    if archive:
+        jobs.enqueue("archive", {}, key=f"archive:{prompt_id}", depends_on=media_job)
+    if notify:
+        jobs.enqueue(
+            "notifications",
+            {"date": prompt.date.isoformat()},
+            key=f"notifications:{prompt_id}",
+            depends_on=media_job,
+        )
+    return True
+
+
+async def record_all(
+    prompts: Mapping[K, tuple[Prompt, bool]], limit: int
+) -> dict[K, bool]:
+    """Record many Prompts a few at a time, each with whether to send its emails.
+
+    The archive is left for the caller to generate once for all of them.
+    """
+    semaphore = asyncio.Semaphore(limit)
+
+    async def record_one(prompt: Prompt, notify: bool) -> bool:
+        async with semaphore:
+            return await record(prompt, archive=False, notify=notify)
+
+    results = await asyncio.gather(*[record_one(*p) for p in prompts.values()])
+    return dict(zip(prompts, results))
@@ -0,0 +1,246 @@
+import json
+import logging
+from datetime import date, datetime
+from time import sleep
+
+import requests
+import sys_vars
+import tweepy
+from httpx import HTTPError
+from pytz import utc
+
+from src.core import fetch, jobs
+from src.core.api import v2
+from src.helpers import config, metrics, periods, ratelimit, tweet
+from src.helpers.candidate import PromptCandidate
+from src.helpers.models import Host, Prompt
+
+__all__ = ["main", "sync_rules", "watch"]
+
+
+log = logging.getLogger("vss365today-finder")
+
+# Marks the stream rules that belong to the finder
+RULE_TAG = "vss365today-finder"
+RULES_URL = f"{tweet.Session.TWITTER_HOST}/2/tweets/search/stream/rules"
+STREAM_URL = f"{tweet.Session.TWITTER_HOST}/2/tweets/search/stream"
+
+# Everything that means the stream went away and should be reconnected
+STREAM_ERRORS = (HTTPError, requests.RequestException, ratelimit.RateLimited)
+
+
+def __period_end(today: date) -> datetime:
+    """Get when the Hosting Period the given date falls in ends."""
+    return datetime.combine(periods.hosting_period(today)[1], datetime.min.time())
+
+
+def __request(method: str, url: str, **kwargs) -> requests.Response:
+    """Send a request with the shared Twitter session and its rate limits."""
+    client = tweet.twitter_v2_api()
+    headers = {
+        "Authorization": f"Bearer {client.bearer_token}",
+        "User-Agent": client.user_agent,
+    }
+    return client.session.request(method, url, headers=headers, **kwargs)
+
+
+def __rule(uid: str) -> str:
+    """Create the stream rule matching the Host's Prompt tweets."""
+    identifiers = " ".join(
+        f"#{ht}" for ht in sorted(config.current().default.identifiers)
+    )
+    return f"from:{uid} {identifiers}"
+
+
+def __needs_new_rule(period_end: datetime, identifiers: frozenset[str]) -> bool:
+    """Check if the stream rule is out of date.
+
+    The rule is for the current Host and the configured identifying hashtags,
+    so it changes with the Hosting Period or when the configuration is edited.
+    """
+    return (
+        datetime.now() >= period_end
+        or config.refresh().default.identifiers != identifiers
+    )
+
+
+def sync_rules(uid: str) -> None:
+    """Make the stream rules match only the current Host's Prompt tweets.
+
+    Rules added by anything else using the same Twitter app are left alone.
+    """
+    wanted = __rule(uid)
+    r = __request("GET", RULES_URL)
+    r.raise_for_status()
+    ours = [rule for rule in r.json().get("data", []) if rule.get("tag") == RULE_TAG]
+
+    # Remove the rules for earlier Hosts or an older configuration
+    if stale := [rule["id"] for rule in ours if rule["value"] != wanted]:
+        __request("POST", RULES_URL, json={"delete": {"ids": stale}}).raise_for_status()
+    if all(rule["value"] != wanted for rule in ours):
+        r = __request(
+            "POST", RULES_URL, json={"add": [{"value": wanted, "tag": RULE_TAG}]}
+        )
+        r.raise_for_status()
+
+
+@metrics.run("stream")
+def __record(response: tweepy.Response, current_host: Host) -> bool:
+    """Record a Prompt tweet from the stream."""
+    candidate = PromptCandidate.from_tweet(response)
+    print(f"Found Prompt tweet {candidate.id}!")
+
+    # The Prompt may have already been recorded by a fetch or manually
+    today = datetime.now()
+    with metrics.span("stream.latest_prompt"):
+        latest_prompt = Prompt.from_api(v2.get("prompts/")[0])
+    return fetch.record_candidate(candidate, current_host, today, latest_prompt)
+
+
+def __listen(
+    current_host: Host, period_end: datetime, identifiers: frozenset[str]
+) -> bool:
+    """Record Prompts from the stream as they are sent.
+
+    Gives back whether anything was heard from the stream before it closed.
+    """
+    fields = tweet.fetch_fields()
+    params = {
+        "expansions": ",".join(fields["expansions"]),
+        "tweet.fields": ",".join(fields["tweet_fields"]),
+        "media.fields": ",".join(fields["media_fields"]),
+    }
+
+    # Twitter sends a keep-alive every 20 seconds, so a longer silence
+    # means the connection has stalled
+    timeout = (10, sys_vars.get_float("STREAM_TIMEOUT", default=30))
+    heard = False
+    with __request("GET", STREAM_URL, params=params, stream=True, timeout=timeout) as r:
+        r.raise_for_status()
+        print("Connected to the stream, waiting for the Prompt...")
+        for line in r.iter_lines():
+            heard = True
+
+            # Reconnect with the new rule straight away
+            if __needs_new_rule(period_end, identifiers):
+                break
+
+            # Blank lines keep the connection open
+            if not line:
+                continue
+
+            # A message cut off or garbled on the way shouldn't drop the stream
+            try:
+                payload = json.loads(line)
+            except ValueError:
+                log.warning(f"Ignoring a stream message that isn't JSON: {line!r}")
+                continue
+
+            # Twitter explains why it is about to disconnect without any tweet
+            if "data" not in payload:
+                log.warning(f"Stream message: {payload.get('errors')}")
+                continue
+
+            # The rule only matches the identifying hashtags,
+            # which doesn't make the tweet a Prompt
+            response = tweet.from_json(payload)
+            if tweet.get_prompt(response) is None:
+                print(f"Tweet {response.data.id} is not a Prompt")
+                continue
+
+            # The stream is still working when the Prompt can't be recorded,
+            # so keep listening and look for it the usual way instead
+            try:
+                __record(response, current_host)
+            except Exception:
+                log.exception(f"Unable to record Prompt tweet {response.data.id}")
+                __catch_up()
+    return heard
+
+
+def __catch_up() -> None:
+    """Look for a Prompt that was sent while the stream was down."""
+    try:
+        fetch.main()
+
+    # Polling is only a fallback, so it can't be allowed to stop the stream
+    except Exception:
+        log.exception("Unable to look for a Prompt sent while the stream was down")
+
+
+def watch(limit: int | None = None) -> bool:
+    """Listen to the filtered stream for Prompts, reconnecting when it drops.
+
+    Gives back False once the stream has failed too many times in a row
+    to keep relying on it. The connections can be limited for testing.
+    """
+    max_failures = sys_vars.get_int("STREAM_MAX_FAILURES", default=10)
+    backoff_min = sys_vars.get_float("STREAM_BACKOFF_MIN", default=5)
+    backoff_max = sys_vars.get_float("STREAM_BACKOFF_MAX", default=320)
+    failures = connections = 0
+
+    while limit is None or connections < limit:
+        connections += 1
+        period_end = __period_end(datetime.now().date())
+        identifiers = config.refresh().default.identifiers
+        too_many = False
+        try:
+            current_host = Host.from_api(v2.get("hosts", "current"))
+            sync_rules(current_host.twitter_uid)
+            heard = __listen(current_host, period_end, identifiers)
+
+        # Nothing can be heard if the Host, the rules, or the stream are unavailable
+        except STREAM_ERRORS as exc:
+            print(f"Stream failed: {exc.__class__.__name__}: {exc}")
+            heard = False
+            too_many = (
+                isinstance(exc, requests.HTTPError)
+                and exc.response is not None
+                and exc.response.status_code == 429
+            )
+
+        # Switch the rule over to the next Host or configuration straight away
+        else:
+            if __needs_new_rule(period_end, identifiers):
+                failures = 0
+                continue
+            print("The stream was closed.")
+
+        # Only a stream that keeps failing without a word is given up on
+        failures = 0 if heard else failures + 1
+        if failures >= max_failures:
+            return False
+        if limit is not None and connections >= limit:
+            break
+
+        # Back off further each time, and for longer when connecting too often
+        __catch_up()
+        delay = min(backoff_min * 2 ** max(failures - 1, 0), backoff_max)
+        if too_many:
+            delay = max(delay, 60)
+        print(f"Reconnecting to the stream in {delay:g}s...")
+        sleep(delay)
+    return True
+
+
+def main() -> None:
+    """Record Prompts as soon as they are sent, falling back to polling."""
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    # Cutoff date
+    if date.today() >= date(2024, 1, 1):
+        print("Today is on or after January 1, 2024. Refusing to run.")
+        return
+
+    # Retry any follow-up tasks that didn't finish when a Prompt was recorded
+    scheduler = BackgroundScheduler(timezone=utc)
+    jobs.register(scheduler)
+    scheduler.start()
+    try:
+        streaming = watch()
+    finally:
+        scheduler.shutdown()
+
+    if not streaming:
+        print("The stream keeps failing, falling back to scheduled fetches...")
+        fetch.schedule()
@@ -0,0 +1,73 @@
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+import tweepy
+
+from src.helpers import classifier, config, tweet
+from src.helpers.models import Media, Prompt
+
+__all__ = ["PromptCandidate"]
+
+
+@dataclass(frozen=True, slots=True)
+class PromptCandidate:
+    """A tweet that might be a Prompt, with only what is needed to record it.
+
+    Holding on to these instead of whole tweepy Responses keeps the
+    raw API data and every other include from staying in memory.
+    """
+
+    id: str
+    text: str
+    created_at: datetime
+    author_handle: str
+    hashtags: tuple[str, ...]
+    media: Media | None = None
+
+    @classmethod
+    def from_tweet(cls, response: tweepy.Response) -> "PromptCandidate":
+        """Decode a tweet Response from the Twitter API."""
+        media_url = tweet.get_media(response)
+        return cls(
+            id=str(response.data.id),
+            text=tweet.get_text(response),
+            created_at=response.data.created_at,
+            author_handle=tweet.get_author_handle(response),
+            hashtags=tuple(classifier.get_hashtags(response.data)),
+            media=(
+                Media(media_url, tweet.get_media_alt_text(response))
+                if media_url is not None
+                else None
+            ),
+        )
+
+    @property
+    def word(self) -> str | None:
+        """Get the prompt word, if this is a Prompt."""
+        return (
+            config.current()
+            .classifier(self.author_handle)
+            .get_prompt(list(self.hashtags))
+        )
+
+    def date_for(self, expected: date) -> date:
+        """Get the date this Prompt is for."""
+        # The tweet date is before the expected date, indicating a
+        # time zone difference. Tweet datetimes are always expressed
+        # in UTC, so move to the next day to match the expected date
+        tweet_date = self.created_at.date()
+        if tweet_date < expected:
+            return tweet_date + timedelta(days=1)
+        return tweet_date
+
+    def to_prompt(self, prompt_date: date, *, is_additional: bool = False) -> Prompt:
+        """Create the Prompt this tweet would be recorded as."""
+        return Prompt(
+            date=prompt_date,
+            word=self.word,
+            content=self.text,
+            host_handle=self.author_handle,
+            twitter_id=self.id,
+            is_additional=is_additional,
+            media=(self.media,) if self.media is not None else (),
+        )
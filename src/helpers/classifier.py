@@ -0,0 +1,72 @@
+from dataclasses import dataclass
+from typing import TypedDict
+
+import tweepy
+
+__all__ = ["Classifier", "get_hashtags"]
+
+
+class Hashtags(TypedDict):
+    start: int
+    end: int
+    tag: str
+
+
+def get_hashtags(tweet: tweepy.Tweet) -> list[str]:
+    """Extract the hashtags from a tweet, if present."""
+    # There are no entities (whatever that means) in this tweet at all
+    if tweet.entities is None:
+        return []
+
+    # There are no hashtags in this tweet
+    if "hashtags" not in tweet.entities:
+        return []
+
+    hts: list[Hashtags] = tweet.entities["hashtags"]
+    return [ht["tag"] for ht in hts]
+
+
+@dataclass(frozen=True, slots=True)
+class Classifier:
+    """Prompt tweet classifier compiled from the Prompt configuration."""
+
+    # Every hashtag that must be present in a Prompt, lowercased
+    identifiers: frozenset[str]
+
+    # Every hashtag that cannot be a Prompt word, lowercased
+    filter: frozenset[str]
+
+    @classmethod
+    def from_config(cls, config: dict) -> "Classifier":
+        """Compile a classifier from the Prompt configuration."""
+        return cls(
+            identifiers=frozenset(ht.lower() for ht in config["identifiers"]),
+            filter=frozenset(ht.lower() for ht in config["filter"]),
+        )
+
+    def is_prompt(self, hts: list[str]) -> bool:
+        """Confirm the hashtags are from a Prompt tweet."""
+        # Make sure at least hashtags are present in the tweet AND
+        # the prompt identifying hashtags are present (via subset set math)
+        return len(hts) >= 3 and self.identifiers.issubset(ht.lower() for ht in hts)
+
+    def get_prompt(self, hts: list[str]) -> str | None:
+        """Get the prompt word from a Prompt tweet's hashtags."""
+        if not self.is_prompt(hts):
+            return None
+
+        # Remove any hashtags that cannot be prompt words.
+        # This cannot use set math as it will change the order of the hashtags,
+        # which makes it impossible to determine the prompt word
+        hts = [ht for ht in hts if ht.lower() not in self.filter]
+
+        # According to the #vss365 charter, a Prompt must contain the hashtags
+        # `#vss365 #prompt #[prompt]`, in that order. Confirm that those hashtags
+        # are in that order and if they are, use that ordering to extract the word
+        try:
+            vss_idx = hts.index("vss365")
+            if hts[vss_idx + 1].lower() != "prompt":
+                return None
+            return hts[vss_idx + 2]
+        except (IndexError, ValueError):
+            return None
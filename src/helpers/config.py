@@ -0,0 +1,152 @@
+import logging
+import threading
+from dataclasses import dataclass, field
+from json import JSONDecodeError, loads
+from pathlib import Path
+from typing import Any
+
+from src.helpers.classifier import Classifier
+
+__all__ = ["Config", "ConfigError", "current", "load", "refresh", "validate"]
+
+
+log = logging.getLogger("vss365today-finder")
+
+CONFIG_PATH = Path("configuration") / "default.json"
+
+__LOCK = threading.Lock()
+__CURRENT: "Config | None" = None
+
+# The last change to the file that couldn't be loaded, so it's only reported once
+__FAILED_MTIME: int | None = None
+
+
+class ConfigError(ValueError):
+    """The Prompt configuration is missing something or has something wrong."""
+
+
+def __hashtags(value: Any, where: str) -> list[str]:
+    """Check a list of hashtags from the configuration."""
+    if not isinstance(value, list) or not all(
+        isinstance(ht, str) and ht.strip().lstrip("#") for ht in value
+    ):
+        raise ConfigError(f'"{where}" must be a list of hashtags')
+
+    # Allow the hashtags to be written the way they are tweeted
+    return [ht.strip().lstrip("#") for ht in value]
+
+
+def validate(data: Any) -> dict:
+    """Check the Prompt configuration and give it back in a consistent form.
+
+    Hosts can be given extra hashtags to filter out of their Prompts:
+    `{"hosts": {"handle": {"filter": ["hashtag"]}}}`.
+    """
+    if not isinstance(data, dict):
+        raise ConfigError("The configuration must be a JSON object")
+    if unknown := set(data) - {"identifiers", "filter", "hosts"}:
+        raise ConfigError(f"Unknown configuration keys: {', '.join(sorted(unknown))}")
+    for key in ("identifiers", "filter"):
+        if key not in data:
+            raise ConfigError(f'The configuration is missing "{key}"')
+
+    # Without any identifiers, every tweet would be a Prompt
+    identifiers = __hashtags(data["identifiers"], "identifiers")
+    if not identifiers:
+        raise ConfigError('"identifiers" must have at least one hashtag')
+
+    if not isinstance(hosts := data.get("hosts", {}), dict):
+        raise ConfigError('"hosts" must be an object of Host handles')
+    overrides = {}
+    for handle, host in hosts.items():
+        if not isinstance(host, dict) or set(host) - {"filter"}:
+            raise ConfigError(f'"hosts.{handle}" can only have a "filter" list')
+        overrides[handle.lstrip("@").lower()] = {
+            "filter": __hashtags(host.get("filter", []), f"hosts.{handle}.filter")
+        }
+
+    return {
+        "identifiers": identifiers,
+        "filter": __hashtags(data["filter"], "filter"),
+        "hosts": overrides,
+    }
+
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    """The Prompt configuration compiled into a classifier for each Host."""
+
+    default: Classifier
+    hosts: dict[str, Classifier] = field(default_factory=dict)
+
+    # When the file was changed before it was loaded, to know when to reload it
+    mtime_ns: int = 0
+
+    @classmethod
+    def from_dict(cls, data: Any, mtime_ns: int = 0) -> "Config":
+        """Validate and compile the Prompt configuration."""
+        data = validate(data)
+        default = Classifier.from_config(data)
+        hosts = {
+            handle: Classifier(
+                identifiers=default.identifiers,
+                filter=default.filter | {ht.lower() for ht in host["filter"]},
+            )
+            for handle, host in data["hosts"].items()
+        }
+        return cls(default, hosts, mtime_ns)
+
+    def classifier(self, host_handle: str | None = None) -> Classifier:
+        """Get the classifier for a Host's tweets, or the default one."""
+        if host_handle is None:
+            return self.default
+        return self.hosts.get(host_handle.lstrip("@").lower(), self.default)
+
+
+def load(path: Path) -> Config:
+    """Load and compile the Prompt configuration file."""
+    # Check the time first so a change made while reading is picked up next time
+    mtime_ns = path.stat().st_mtime_ns
+    try:
+        data = loads(path.read_text())
+    except JSONDecodeError as exc:
+        raise ConfigError(f"{path} is not valid JSON: {exc}") from exc
+    return Config.from_dict(data, mtime_ns)
+
+
+def current() -> Config:
+    """Get the Prompt configuration, loading it the first time it is needed."""
+    global __CURRENT
+    if (config := __CURRENT) is None:
+        with __LOCK:
+            if __CURRENT is None:
+                __CURRENT = load(CONFIG_PATH)
+            config = __CURRENT
+    return config
+
+
+def refresh() -> Config:
+    """Reload the Prompt configuration if its file changed since it was loaded.
+
+    Anything already using the old configuration keeps it, and everything
+    after gets the new one. A file that can't be loaded is reported and the
+    last good configuration is kept, so a typo doesn't stop a running finder.
+    """
+    global __CURRENT, __FAILED_MTIME
+    config = current()
+    mtime_ns = None
+    try:
+        mtime_ns = CONFIG_PATH.stat().st_mtime_ns
+        if mtime_ns in (config.mtime_ns, __FAILED_MTIME):
+            return config
+        config = load(CONFIG_PATH)
+
+    except (OSError, ConfigError) as exc:
+        __FAILED_MTIME = mtime_ns if isinstance(exc, ConfigError) else None
+        log.error(f"Unable to reload the Prompt configuration, keeping the last: {exc}")
+        return config
+
+    with __LOCK:
+        __CURRENT = config
+    log.info(f"Reloaded the Prompt configuration from {CONFIG_PATH}")
+    return config
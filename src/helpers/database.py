@@ -0,0 +1,20 @@
+import sqlite3
+from pathlib import Path
+
+import sys_vars
+
+
+__all__ = ["connect"]
+
+
+def connect(name: str) -> sqlite3.Connection:
+    """Connect to a local SQLite database in the data directory.
+
+    The databases are shared between every finder process,
+    so they are opened in WAL mode to allow concurrent readers.
+    """
+    data_dir = sys_vars.get_path("DATA_DIR", default=Path("data"))
+    data_dir.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(data_dir / f"{name}.db", timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
@@ -0,0 +1,14 @@
+from hashlib import sha256
+from pathlib import Path
+
+
+__all__ = ["hash_file"]
+
+
+def hash_file(path: Path) -> str:
+    """Hash the contents of a file without reading it all at once."""
+    file_hash = sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(1024 * 1024):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
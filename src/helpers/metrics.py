@@ -0,0 +1,214 @@
+import json
+import re
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from functools import wraps
+from os import replace
+from pathlib import Path
+from time import perf_counter, time
+from typing import Any, Callable, Iterator
+from uuid import uuid4
+
+import sys_vars
+
+__all__ = ["Recording", "Span", "export", "gauge", "route", "run", "span", "summary"]
+
+
+@dataclass(slots=True)
+class Span:
+    name: str
+    started: float
+    seconds: float = 0.0
+
+    # Extra information about the span, such as the HTTP status or bytes
+    labels: dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class Recording:
+    """Everything measured during a single run."""
+
+    spans: list[Span] = field(default_factory=list)
+
+    # The last value of each gauge, keyed by name and sorted labels
+    gauges: dict[tuple[str, tuple], float] = field(default_factory=dict)
+
+
+__LOCK = threading.Lock()
+
+# Each run records into its own context so runs happening at the same time
+# in one process, such as scheduled jobs, don't mix up their metrics.
+# Anything measured outside of a run isn't kept
+__RECORDING: ContextVar[Recording | None] = ContextVar("recording", default=None)
+
+
+def __metrics_dir() -> Path:
+    """Get the directory the metrics files are written to."""
+    default = sys_vars.get_path("DATA_DIR", default=Path("data")) / "metrics"
+    return sys_vars.get_path("METRICS_DIR", default=default)
+
+
+def __escape(value: Any) -> str:
+    """Escape a value for use as a Prometheus label value."""
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def route(path: str) -> str:
+    """Collapse the IDs and dates in a URL path so similar requests group together."""
+    path = re.sub(r"/\d{4}-\d{2}-\d{2}(?=/|$)", "/:date", path)
+    return re.sub(r"/\d+(?=/|$)", "/:id", path)
+
+
+def gauge(name: str, value: float, **labels: Any) -> None:
+    """Record the latest value of something, such as the quota left for an endpoint."""
+    if (recording := __RECORDING.get()) is not None:
+        with __LOCK:
+            recording.gauges[(name, tuple(sorted(labels.items())))] = value
+
+
+@contextmanager
+def span(name: str, **labels: Any) -> Iterator[dict[str, Any]]:
+    """Time a block of code.
+
+    The labels are yielded so the block can add more information as it learns it.
+    """
+    current = Span(name, time(), labels=labels)
+    start = perf_counter()
+    try:
+        yield current.labels
+    except BaseException as exc:
+        current.labels["error"] = exc.__class__.__name__
+        raise
+    finally:
+        current.seconds = perf_counter() - start
+        if (recording := __RECORDING.get()) is not None:
+            with __LOCK:
+                recording.spans.append(current)
+
+
+def summary(run_name: str) -> str:
+    """Summarize where the time went in a run on a single line."""
+    recording = __RECORDING.get() or Recording()
+    with __LOCK:
+        spans = list(recording.spans)
+        gauges = dict(recording.gauges)
+
+    totals: dict[str, list[float]] = defaultdict(list)
+    for s in spans:
+        name = f"{s.name} {s.labels['route']}" if "route" in s.labels else s.name
+        totals[name].append(s.seconds)
+    parts = [
+        f"{name} {sum(times):.3f}s" + (f" ({len(times)}x)" if len(times) > 1 else "")
+        for name, times in totals.items()
+    ]
+    parts.extend(
+        " ".join([name, *(str(v) for _, v in labels), f"{value:g}"])
+        for (name, labels), value in gauges.items()
+    )
+    return f"[metrics] {run_name}: " + ", ".join(parts)
+
+
+def __rotate(path: Path) -> None:
+    """Move a JSON lines file aside once it is too big, keeping a few old ones."""
+    max_bytes = sys_vars.get_int("METRICS_MAX_BYTES", default=5_000_000)
+    backups = sys_vars.get_int("METRICS_BACKUP_COUNT", default=5)
+    if not path.exists() or path.stat().st_size < max_bytes:
+        return
+
+    # Shift every older file along, dropping the oldest, the same as the logs
+    for i in range(backups - 1, 0, -1):
+        if (older := path.with_name(f"{path.name}.{i}")).exists():
+            replace(older, path.with_name(f"{path.name}.{i + 1}"))
+    if backups > 0:
+        replace(path, path.with_name(f"{path.name}.1"))
+    else:
+        path.unlink()
+
+
+def export(run_name: str) -> None:
+    """Write the run's spans as a Prometheus textfile and as JSON lines."""
+    recording = __RECORDING.get() or Recording()
+    with __LOCK:
+        spans = list(recording.spans)
+        gauges = dict(recording.gauges)
+    metrics_dir = __metrics_dir()
+    metrics_dir.mkdir(parents=True, exist_ok=True)
+
+    # Every span is kept as-is in the JSON lines file
+    run_id = uuid4().hex
+    jsonl_file = metrics_dir / f"finder_{run_name}.jsonl"
+    with __LOCK:
+        __rotate(jsonl_file)
+        with jsonl_file.open("a") as f:
+            for s in spans:
+                f.write(
+                    json.dumps({"run": run_id, "command": run_name, **asdict(s)}) + "\n"
+                )
+
+    # Aggregate the spans by name and labels for Prometheus
+    seconds: dict[str, float] = defaultdict(float)
+    counts: dict[str, int] = defaultdict(int)
+    sizes: dict[str, int] = defaultdict(int)
+    for s in spans:
+        labels = {"command": run_name, "span": s.name}
+        labels.update({k: v for k, v in s.labels.items() if k not in ("bytes",)})
+        key = ",".join(f'{k}="{__escape(v)}"' for k, v in sorted(labels.items()))
+        seconds[key] += s.seconds
+        counts[key] += 1
+        sizes[key] += int(s.labels.get("bytes", 0) or 0)
+
+    lines = [
+        "# HELP finder_span_seconds Time spent in each phase of the last run.",
+        "# TYPE finder_span_seconds gauge",
+        *(f"finder_span_seconds{{{k}}} {v:.6f}" for k, v in seconds.items()),
+        "# HELP finder_span_count Times each phase ran in the last run.",
+        "# TYPE finder_span_count gauge",
+        *(f"finder_span_count{{{k}}} {v}" for k, v in counts.items()),
+        "# HELP finder_span_bytes Response bytes received in each phase.",
+        "# TYPE finder_span_bytes gauge",
+        *(f"finder_span_bytes{{{k}}} {v}" for k, v in sizes.items()),
+        "# HELP finder_last_run_timestamp_seconds When the last run finished.",
+        "# TYPE finder_last_run_timestamp_seconds gauge",
+        f'finder_last_run_timestamp_seconds{{command="{run_name}"}} {time():.0f}',
+    ]
+    for name in sorted({name for name, _ in gauges}):
+        lines.append(f"# TYPE finder_{name} gauge")
+        for (gauge_name, labels), value in gauges.items():
+            if gauge_name == name:
+                key = ",".join(
+                    f'{k}="{__escape(v)}"' for k, v in (("command", run_name), *labels)
+                )
+                lines.append(f"finder_{name}{{{key}}} {value:g}")
+
+    # Replace the textfile atomically so a collector never reads half of it
+    prom_file = metrics_dir / f"finder_{run_name}.prom"
+    tmp_file = prom_file.with_suffix(".prom.tmp")
+    tmp_file.write_text("\n".join(lines) + "\n")
+    replace(tmp_file, prom_file)
+
+
+def run(run_name: str) -> Callable:
+    """Time an entire command run, then export and summarize its spans."""
+
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            token = __RECORDING.set(Recording())
+            try:
+                with span("run") as labels:
+                    result = labels["result"] = func(*args, **kwargs)
+                return result
+            finally:
+                print(summary(run_name))
+                try:
+                    export(run_name)
+                except OSError as exc:
+                    print(f"Unable to write metrics for {run_name}: {exc}")
+                __RECORDING.reset(token)
+
+        return wrapper
+
+    return decorator
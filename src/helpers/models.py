@@ -0,0 +1,82 @@
+from dataclasses import dataclass
+from datetime import date
+
+__all__ = ["Host", "Media", "Prompt"]
+
+
+@dataclass(frozen=True, slots=True)
+class Media:
+    url: str
+    alt_text: str | None = None
+
+    @classmethod
+    def from_api(cls, data: dict) -> "Media":
+        """Decode a Prompt Media item from the API."""
+        return cls(url=data["url"], alt_text=data.get("alt_text"))
+
+    def to_api(self) -> dict:
+        """Encode the media as an API request item."""
+        return {"alt_text": self.alt_text, "url": self.url}
+
+
+@dataclass(frozen=True, slots=True)
+class Host:
+    id: str
+    handle: str
+    twitter_uid: str
+
+    @classmethod
+    def from_api(cls, data: dict) -> "Host":
+        """Decode a Host from the API."""
+        return cls(
+            id=str(data.get("_id", "")),
+            handle=data["handle"],
+            twitter_uid=str(data["twitter_uid"]),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class Prompt:
+    date: date
+    word: str | None
+    content: str
+    host_handle: str
+    twitter_id: str
+    is_additional: bool = False
+    media: tuple[Media, ...] = ()
+
+    # Only Prompts that have been recorded have an ID
+    id: str | None = None
+
+    @classmethod
+    def from_api(cls, data: dict) -> "Prompt":
+        """Decode a Prompt from the API."""
+        return cls(
+            date=date.fromisoformat(data["date"]),
+            word=data.get("word"),
+            content=data.get("content", ""),
+            host_handle=data.get("host_handle", ""),
+            twitter_id=str(data.get("twitter_id", "")),
+            is_additional=bool(data.get("is_additional", False)),
+            media=tuple(
+                Media.from_api(item)
+                for item in data.get("media") or []
+                if item.get("url")
+            ),
+            id=str(data["_id"]) if "_id" in data else None,
+        )
+
+    def to_api(self) -> dict:
+        """Encode the Prompt as an API request object."""
+        return {
+            "content": self.content,
+            "date": self.date.isoformat(),
+            "host_handle": self.host_handle,
+            "is_additional": self.is_additional,
+            "twitter_id": self.twitter_id,
+            "word": self.word,
+        }
+
+    def media_to_api(self) -> dict:
+        """Encode the Prompt's media as an API request object."""
+        return {"items": [item.to_api() for item in self.media]}
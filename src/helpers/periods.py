@@ -0,0 +1,21 @@
+from datetime import date, timedelta
+
+
+__all__ = ["days", "hosting_period"]
+
+
+def days(start: date, end: date) -> list[date]:
+    """Get every date from the start to the end, including both.
+
+    There are none if the start is after the end.
+    """
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def hosting_period(today: date) -> tuple[date, date]:
+    """Get the first day of the Hosting Period a date falls in and of the next one."""
+    # Hosts serve for 15 days, starting on the 1st and 16th of the month
+    if today.day < 16:
+        return today.replace(day=1), today.replace(day=16)
+    next_month = (today.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return today.replace(day=16), next_month
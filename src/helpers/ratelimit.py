@@ -0,0 +1,104 @@
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from time import sleep, time
+from typing import Mapping
+
+from pytz import utc
+
+from src.helpers import database, metrics
+
+
+__all__ = ["RateLimited", "acquire", "update"]
+
+
+class RateLimited(Exception):
+    """The rate limit for an endpoint is used up and won't reset soon enough."""
+
+    def __init__(self, route: str, reset: float) -> None:
+        self.route = route
+        self.reset = reset
+        until = datetime.fromtimestamp(reset, tz=utc).strftime("%H:%M:%S UTC")
+        super().__init__(f"Rate limit reached for {route} until {until}")
+
+
+def __connect() -> sqlite3.Connection:
+    """Connect to the rate limit database."""
+    conn = database.connect("ratelimit")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS limits ("
+        "route TEXT PRIMARY KEY, "
+        "quota INTEGER NOT NULL, "
+        "remaining INTEGER NOT NULL, "
+        "reset REAL NOT NULL)"
+    )
+    return conn
+
+
+def acquire(route: str, max_wait: float) -> None:
+    """Take a request from an endpoint's budget, waiting for it to reset if needed.
+
+    The budget is shared by every process, so a backfill and a scheduled fetch
+    running at the same time don't use up each other's requests. Endpoints
+    that haven't been seen yet, or whose window has passed, are not limited.
+    """
+    while True:
+        now = time()
+        with closing(__connect()) as conn, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT remaining, reset FROM limits WHERE route = ?", (route,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                return
+            if row[0] > 0:
+                conn.execute(
+                    "UPDATE limits SET remaining = remaining - 1 WHERE route = ?",
+                    (route,),
+                )
+                return
+            reset = row[1]
+
+        # Give up instead of waiting on a window that won't reset soon
+        if reset - now > max_wait:
+            raise RateLimited(route, reset)
+
+        # Wait a little past the reset to allow for clock differences
+        print(f"Twitter rate limit reached for {route}, waiting {reset - now:.0f}s...")
+        with metrics.span("twitter.wait", route=route):
+            sleep(reset - now + 1)
+
+
+def update(route: str, headers: Mapping[str, str], status: int) -> None:
+    """Record the budget an endpoint has left from a response's rate limit headers."""
+    try:
+        quota = int(headers["x-rate-limit-limit"])
+        remaining = int(headers["x-rate-limit-remaining"])
+        reset = float(headers["x-rate-limit-reset"])
+
+    # Not every endpoint is rate limited
+    except (KeyError, ValueError):
+        return
+
+    # Nothing else can be sent until the window resets
+    if status == 429:
+        remaining = 0
+
+    with closing(__connect()) as conn, conn:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT remaining, reset FROM limits WHERE route = ?", (route,)
+        ).fetchone()
+
+        # Other processes may have taken requests from the same window
+        # that the API hasn't counted yet, so trust the lower number
+        if row is not None and row[1] == reset:
+            remaining = min(remaining, row[0])
+        conn.execute(
+            "INSERT OR REPLACE INTO limits (route, quota, remaining, reset) "
+            "VALUES (?, ?, ?, ?)",
+            (route, quota, remaining, reset),
+        )
+
+    metrics.gauge("twitter_rate_limit_remaining", remaining, route=route)
+    metrics.gauge("twitter_rate_limit_quota", quota, route=route)
@@ -0,0 +1,34 @@
+import sqlite3
+from contextlib import closing
+from json import dumps, loads
+from typing import Any
+
+from src.helpers import database
+
+
+__all__ = ["load", "save"]
+
+
+def __connect() -> sqlite3.Connection:
+    """Connect to the state database."""
+    conn = database.connect("state")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+    )
+    return conn
+
+
+def load(key: str, default: Any = None) -> Any:
+    """Load a previously saved value."""
+    with closing(__connect()) as conn, conn:
+        row = conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+    return loads(row[0]) if row is not None else default
+
+
+def save(key: str, value: Any) -> None:
+    """Save a JSON-serializable value, replacing any previous value."""
+    with closing(__connect()) as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)",
+            (key, dumps(value)),
+        )
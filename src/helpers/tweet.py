@@ -1,79 +1,92 @@
-from json import loads
-from pathlib import Path
-from typing import TypedDict
+from datetime import datetime
+from functools import cache
+from typing import Any, Iterable, Iterator
 
+import requests
 import sys_vars
 import tweepy
 from httpx import URL
+from pytz import utc
+
+from src.helpers import classifier, config, metrics, ratelimit
 
 __all__ = [
+    "Session",
     "is_prompt_tweet",
     "is_likely_prompt_tweet",
     "fetch_fields",
+    "flatten",
+    "from_json",
+    "from_page",
+    "get_author_handle",
     "get_id",
     "get_media",
+    "get_media_alt_text",
     "get_prompt",
+    "get_sent_time",
     "get_text",
     "is_url",
     "twitter_v2_api",
 ]
 
 
-class Hashtags(TypedDict):
-    start: int
-    end: int
-    tag: str
+class Session(requests.Session):
+    """A Twitter API session that can send requests to another host.
+
+    Every request is taken from its endpoint's shared rate limit budget first,
+    waiting up to `max_wait` seconds for it to reset before giving up.
+    """
+
+    TWITTER_HOST = "https://api.twitter.com"
+
+    def __init__(self, base_url: str = "", max_wait: float = 900) -> None:
+        super().__init__()
+        self.base_url = base_url.rstrip("/")
+        self.max_wait = max_wait
+
+    # Everything besides the method and URL is handed to requests untouched
+    def request(  # type: ignore[override]
+        self, method: str, url: str, *args: Any, **kwargs: Any
+    ) -> requests.Response:
+        # Keep the API version out of the route so it isn't mistaken for an ID
+        path = url.removeprefix(self.TWITTER_HOST).split("?")[0]
+        route = "/2" + metrics.route(path.removeprefix("/2"))
+        if self.base_url and url.startswith(self.TWITTER_HOST):
+            url = self.base_url + url.removeprefix(self.TWITTER_HOST)
 
+        ratelimit.acquire(f"{method} {route}", self.max_wait)
+        with metrics.span("twitter", method=method, route=route) as labels:
+            r = super().request(method, url, *args, **kwargs)
+            labels.update(status=r.status_code, attempt=1)
 
-CONFIG = loads((Path("configuration") / "default.json").read_text())
+            # A streamed body is read later, so its size isn't known yet
+            if not kwargs.get("stream"):
+                labels["bytes"] = len(r.content)
+        ratelimit.update(f"{method} {route}", r.headers, r.status_code)
+        return r
 
 
-def __filter_hashtags(hts: list[str]) -> list[str]:
-    """Filter out any hashtags that should not be considered a prompt."""
-    # This cannot use set math as it will change the order of the hashtags,
-    # which makes it impossible to determine the prompt word
-    return [ht for ht in hts if ht.lower() not in CONFIG["filter"]]
+# The tweepy object each kind of include is made from
+INCLUDE_TYPES = {"media": tweepy.Media, "users": tweepy.User}
 
 
 def __get_media_obj(tweet: tweepy.Response) -> dict | None:
     """Get the media object from the tweet."""
     # This tweet has no media in it
-    if tweet.data.attachments is None:
+    if tweet.data.attachments is None or not tweet.includes.get("media"):
         return None
 
     # Shortcut to the media (because it's pretty buried in the response)
     return tweet.includes["media"][0].data
 
 
-def __extract_hashtags(tweet: tweepy.Tweet) -> list[str]:
-    """Extract the hashtags from a tweet, if present."""
-    # There are no entities (whatever that means) in this tweet at all
-    if tweet.entities is None:
-        return []
-
-    # There are no hashtags in this tweet
-    if "hashtags" not in tweet.entities:
-        return []
-
-    hts: list[Hashtags] = tweet.entities["hashtags"]
-    return [ht["tag"] for ht in hts]
-
-
 def is_prompt_tweet(hts: list[str]) -> bool:
     """Confirm this is the Prompt tweet."""
-    # No hashtags were provided
-    if not hts:
-        return False
-
-    # Make sure at least hashtags are present in the tweet AND
-    # the prompt identifying hashtags are present (via subset set math)
-    hts = [ht.lower() for ht in hts]
-    return len(hts) >= 3 and set(CONFIG["identifiers"]) <= set(hts)
+    return config.current().default.is_prompt(hts)
 
 
 def is_likely_prompt_tweet(tweet: tweepy.Tweet):
-    hts = __extract_hashtags(tweet)
-    return is_prompt_tweet(hts)
+    return config.current().default.is_prompt(classifier.get_hashtags(tweet))
 
 
 def fetch_fields() -> dict[str, list[str]]:
@@ -85,6 +98,45 @@ def fetch_fields() -> dict[str, list[str]]:
     }
 
 
+def from_json(payload: dict) -> tweepy.Response:
+    """Create a single tweet Response from its raw API data."""
+    includes = {
+        name: [INCLUDE_TYPES[name](item) for item in items]
+        for name, items in payload.get("includes", {}).items()
+        if name in INCLUDE_TYPES
+    }
+    return tweepy.Response(tweepy.Tweet(payload["data"]), includes, [], {})
+
+
+def from_page(page: tweepy.Response, data: tweepy.Tweet) -> tweepy.Response:
+    """Create a single tweet Response from a tweet in a page of results.
+
+    The page includes are narrowed down to only the media and author
+    for the tweet, making it identical to a `get_tweet()` Response.
+    """
+    media_keys = (data.attachments or {}).get("media_keys", [])
+    page_media = {media.media_key: media for media in page.includes.get("media", [])}
+    includes = {
+        "media": [page_media[key] for key in media_keys if key in page_media],
+        "users": [
+            user for user in page.includes.get("users", []) if user.id == data.author_id
+        ],
+    }
+    return tweepy.Response(data, includes, [], {})
+
+
+def flatten(pages: Iterable[tweepy.Response]) -> Iterator[tweepy.Response]:
+    """Flatten pages of results into single tweet Responses."""
+    for page in pages:
+        for data in page.data or []:
+            yield from_page(page, data)
+
+
+def get_author_handle(tweet: tweepy.Response) -> str:
+    """Get the handle of the tweet author."""
+    return tweet.includes["users"][0].username
+
+
 def get_id(url: str) -> str:
     """Confirm this is a tweet url and get its ID."""
     # Parse the URL into its components and pull out the tweet id
@@ -114,27 +166,22 @@ def get_media_alt_text(tweet: tweepy.Response) -> str | None:
     return None
 
 
-def get_prompt(tweet: tweepy.Tweet) -> str | None:
-    """Get the prompt word from the tweet."""
-    # Pull out any hashtags from the tweet
-    hts = __extract_hashtags(tweet.data)
+def get_prompt(tweet: tweepy.Response) -> str | None:
+    """Get the prompt word from the tweet, using the author's own filter if known."""
+    handle = get_author_handle(tweet) if (tweet.includes or {}).get("users") else None
+    return (
+        config.current()
+        .classifier(handle)
+        .get_prompt(classifier.get_hashtags(tweet.data))
+    )
 
-    # This is not the prompt tweet
-    if not is_prompt_tweet(hts):
-        return None
 
-    # Remove any hashtags that cannot be prompt words
-    hts = __filter_hashtags(hts)
-
-    # According to the #vss365 charter, a Prompt must contain the hashtags
-    # `#vss365 #prompt #[prompt]`, in that order. Confirm that those hashtags
-    # are in that order and if they are, use that ordering to extract the word
-    try:
-        vss_idx = hts.index("vss365")
-        assert hts[vss_idx + 1].lower() == "prompt"
-        return hts[vss_idx + 2]
-    except (AssertionError, IndexError, ValueError):
-        return None
+def get_sent_time(tweet_id: str | int) -> datetime:
+    """Get when a tweet was sent from its ID alone."""
+    # Tweet IDs are Snowflakes, which start with the milliseconds
+    # since the Twitter epoch (2010-11-04T01:42:54.657Z)
+    timestamp = ((int(tweet_id) >> 22) + 1288834974657) / 1000
+    return datetime.fromtimestamp(timestamp, tz=utc)
 
 
 def get_text(tweet: tweepy.Response) -> str:
@@ -148,6 +195,15 @@ def is_url(url: str) -> bool:
     return "twitter.com/" in url and "/status/" in url
 
 
+@cache
 def twitter_v2_api() -> tweepy.Client:
-    """Connect to Twitter API v2 using a Bearer token."""
-    return tweepy.Client(bearer_token=sys_vars.get("TWITTER_BEARER"))
+    """Connect to Twitter API v2 using a Bearer token.
+
+    The client is created once and shared by everything in the process.
+    """
+    client = tweepy.Client(bearer_token=sys_vars.get("TWITTER_BEARER"))
+    client.session = Session(
+        sys_vars.get("TWITTER_API_URL", default=""),
+        sys_vars.get_int("TWITTER_RATE_LIMIT_WAIT", default=900),
+    )
+    return client
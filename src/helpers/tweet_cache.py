@@ -0,0 +1,108 @@
+import sqlite3
+from contextlib import closing
+from hashlib import sha1
+from json import dumps, loads
+from time import time
+from typing import Iterable
+
+import sys_vars
+import tweepy
+
+from src.helpers import database, tweet
+
+
+__all__ = ["get_tweet", "get_tweets", "load", "save"]
+
+
+def __connect() -> sqlite3.Connection:
+    """Connect to the tweet cache database."""
+    conn = database.connect("tweets")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS tweets ("
+        "key TEXT PRIMARY KEY, "
+        "value TEXT NOT NULL, "
+        "used REAL NOT NULL)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS tweets_used ON tweets (used)")
+    return conn
+
+
+def __create_key(tweet_id: str | int, fields: dict[str, list[str]]) -> str:
+    """Create a cache key for a tweet fetched with a set of fields.
+
+    The same tweet fetched with different fields has different information,
+    so each set of fields is cached separately.
+    """
+    field_hash = sha1(dumps(fields, sort_keys=True).encode()).hexdigest()[:12]
+    return f"{tweet_id}:{field_hash}"
+
+
+def load(tweet_id: str | int, fields: dict[str, list[str]]) -> tweepy.Response | None:
+    """Load a cached tweet, if there is one."""
+    key = __create_key(tweet_id, fields)
+    with closing(__connect()) as conn, conn:
+        row = conn.execute("SELECT value FROM tweets WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE tweets SET used = ? WHERE key = ?", (time(), key))
+
+    # Rebuild the tweepy objects from their raw API data
+    return tweet.from_json(loads(row[0]))
+
+
+def save(response: tweepy.Response, fields: dict[str, list[str]]) -> None:
+    """Cache a tweet, evicting the least recently used tweets past the size cap."""
+    value = {
+        "data": response.data.data,
+        "includes": {
+            name: [item.data for item in items]
+            for name, items in (response.includes or {}).items()
+            if name in tweet.INCLUDE_TYPES
+        },
+    }
+    size = sys_vars.get_int("TWEET_CACHE_SIZE", default=1000)
+    with closing(__connect()) as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO tweets (key, value, used) VALUES (?, ?, ?)",
+            (__create_key(response.data.id, fields), dumps(value), time()),
+        )
+        conn.execute(
+            "DELETE FROM tweets WHERE key NOT IN "
+            "(SELECT key FROM tweets ORDER BY used DESC LIMIT ?)",
+            (size,),
+        )
+
+
+def get_tweet(tweet_id: str | int) -> tweepy.Response:
+    """Get a tweet with everything needed about a Prompt, from the cache if possible."""
+    fields = tweet.fetch_fields()
+    if (response := load(tweet_id, fields)) is not None:
+        return response
+
+    # Don't remember tweets that couldn't be found
+    response = tweet.twitter_v2_api().get_tweet(tweet_id, **fields)
+    if response.data is not None:
+        save(response, fields)
+    return response
+
+
+def get_tweets(tweet_ids: Iterable[str | int]) -> dict[str, tweepy.Response | None]:
+    """Get many tweets with everything needed about a Prompt, cached where possible.
+
+    Tweets that aren't cached are looked up 100 at a time, the most Twitter allows
+    in one request. Tweets that couldn't be found are given back as `None`.
+    """
+    fields = tweet.fetch_fields()
+    found: dict[str, tweepy.Response | None] = {}
+    for tweet_id in map(str, tweet_ids):
+        if tweet_id not in found:
+            found[tweet_id] = load(tweet_id, fields)
+
+    missing = [tweet_id for tweet_id, response in found.items() if response is None]
+    for i in range(0, len(missing), 100):
+        ids = missing[i : i + 100]
+        page = tweet.twitter_v2_api().get_tweets(ids, **fields)
+        for response in tweet.flatten([page]):
+            found[str(response.data.id)] = response
+            save(response, fields)
+    return found